@@ -1,12 +1,21 @@
 """Главный файл приложения"""
 import asyncio
 from src.cli.application import CLIApplication
+from src.cli.early_input import start_capturing_early_input, restore_terminal
 
 
 async def main():
     """Точка входа в приложение"""
-    app = CLIApplication()
-    await app.run()
+    # Начинаем захват клавиатуры до инициализации, чтобы нажатия
+    # во время подключения к БД не терялись
+    start_capturing_early_input()
+    try:
+        app = CLIApplication()
+        await app.run()
+    finally:
+        # Терминал возвращается в исходный режим даже если инициализация
+        # упала до первого чтения команды
+        restore_terminal()
 
 
 if __name__ == "__main__":
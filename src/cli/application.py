@@ -1,497 +1,627 @@
-
-import asyncio
-import shlex
-from pathlib import Path
-from typing import Optional
-
-from src.core.config import config
-from src.core.database import db
-from src.core.models import Base
-from src.core.security import resolve_secure_path
-from src.users.auth import create_user, authenticate_user
-from src.files.manager import file_manager
-from src.system.disks import get_disk_info, format_bytes
-
-
-class ApplicationState:
-    """Состояние приложения"""
-    def __init__(self):
-        self.current_user_id: Optional[int] = None
-        self.current_path: str = "."
-    
-    def get_current_relative_path(self) -> str:
-        """Получить текущий относительный путь"""
-        return self.current_path if self.current_path != "." else ""
-
-
-class CLIApplication:
-    """Интерактивное CLI приложение"""
-    
-    def __init__(self):
-        self.state = ApplicationState()
-        self.running = True
-    
-    async def initialize(self):
-        """Инициализация приложения"""
-        await db.connect()
-        
-        # Создание таблиц
-        if db._engine:
-            async with db._engine.begin() as conn:
-                await conn.run_sync(Base.metadata.create_all)
-        
-        print("Безопасный файловый менеджер")
-        print("Введите 'help' для списка команд или 'exit' для выхода")
-        print()
-    
-    async def cleanup(self):
-        """Очистка ресурсов"""
-        await db.disconnect()
-    
-    def print_prompt(self):
-        """Вывод приглашения к вводу"""
-        path = self.state.get_current_relative_path()
-        if path:
-            print(f"{path}> ", end="", flush=True)
-        else:
-            print("/> ", end="", flush=True)
-    
-    async def handle_command(self, command_line: str):
-        """Обработка команды"""
-        if not command_line.strip():
-            return
-        
-        parts = shlex.split(command_line)
-        if not parts:
-            return
-        
-        cmd = parts[0].lower()
-        args = parts[1:]
-        
-        try:
-            if cmd == "exit":
-                self.running = False
-            elif cmd == "help":
-                self.print_help()
-            elif cmd == "register":
-                await self.cmd_register()
-            elif cmd == "login":
-                await self.cmd_login()
-            elif cmd == "logout":
-                await self.cmd_logout()
-            elif cmd == "pwd":
-                await self.cmd_pwd()
-            elif cmd == "ls":
-                await self.cmd_ls(args)
-            elif cmd == "cd":
-                await self.cmd_cd(args)
-            elif cmd == "clear":
-                self.cmd_clear()
-            elif cmd == "disk":
-                await self.cmd_disk()
-            elif cmd == "touch":
-                await self.cmd_touch(args)
-            elif cmd == "rm":
-                await self.cmd_rm(args)
-            elif cmd == "cat":
-                await self.cmd_cat(args)
-            elif cmd == "wr":
-                await self.cmd_wr(args)
-            elif cmd == "mkdir":
-                await self.cmd_mkdir(args)
-            elif cmd == "rmdir":
-                await self.cmd_rmdir(args)
-            elif cmd == "mv":
-                await self.cmd_mv(args)
-            elif cmd == "zip":
-                await self.cmd_zip(args)
-            elif cmd == "unzip":
-                await self.cmd_unzip(args)
-            else:
-                print(f"Неизвестная команда: {cmd}. Введите 'help' для списка команд.")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    def print_help(self):
-        """Вывод справки"""
-        help_text = """
-Доступные команды:
-
-Пользователи:
-  register              - Регистрация нового пользователя
-  login                 - Вход в систему
-  logout                - Выход из системы
-
-Навигация:
-  pwd                   - Показать текущий путь
-  ls [path]             - Список файлов и директорий
-  cd <path>             - Перейти в директорию (используйте '..' для подъема)
-  clear                 - Очистить экран
-
-Диски:
-  disk                  - Информация о дисках системы
-
-Файлы:
-  touch <name>          - Создать файл
-  rm <name>             - Удалить файл
-  cat <name>            - Показать содержимое файла
-  wr <name> <content>   - Записать/добавить содержимое в файл
-
-Директории:
-  mkdir <name>          - Создать директорию
-  rmdir <name> [-r]     - Удалить директорию (используйте -r для рекурсивного удаления)
-
-Операции:
-  mv <source> <dest>    - Переместить файл или директорию
-  zip <archive> <src...> - Создать ZIP архив
-  unzip <archive> <dest> - Распаковать ZIP архив
-
-Прочее:
-  help                  - Показать эту справку
-  exit                  - Выход из программы
-"""
-        print(help_text)
-    
-    async def cmd_register(self):
-        """Регистрация пользователя"""
-        username = input("Введите логин: ").strip()
-        if not username:
-            print("Логин не может быть пустым")
-            return
-        
-        password = self.get_password("Введите пароль: ")
-        password2 = self.get_password("Повторите пароль: ")
-        
-        if password != password2:
-            print("Пароли не совпадают")
-            return
-        
-        try:
-            user = await create_user(username, password)
-            print(f"Пользователь '{username}' успешно зарегистрирован")
-        except ValueError as e:
-            print(f"Ошибка регистрации: {e}")
-    
-    async def cmd_login(self):
-        """Вход в систему"""
-        username = input("Введите логин: ").strip()
-        password = self.get_password("Введите пароль: ")
-        
-        user = await authenticate_user(username, password)
-        if user:
-            self.state.current_user_id = user.id
-            print(f"Добро пожаловать, {username}!")
-        else:
-            print("Неверный логин или пароль")
-    
-    async def cmd_logout(self):
-        """Выход из системы"""
-        self.state.current_user_id = None
-        print("Вы вышли из системы")
-    
-    def get_password(self, prompt: str) -> str:
-        """Безопасный ввод пароля"""
-        import getpass
-        return getpass.getpass(prompt)
-    
-    async def cmd_pwd(self):
-        """Показать текущий путь"""
-        path = self.state.get_current_relative_path()
-        print(path if path else "/")
-    
-    async def cmd_ls(self, args: list):
-        """Список файлов и директорий"""
-        path = args[0] if args else self.state.get_current_relative_path()
-        if not path:
-            path = "."
-        
-        try:
-            items = await file_manager.list_directory(path)
-            for item in items:
-                if item["type"] == "directory":
-                    print(f"[DIR]  {item['name']}")
-                else:
-                    size_str = format_bytes(item["size"])
-                    print(f"       {item['name']:<30} {size_str:>10}")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_cd(self, args: list):
-        """Переход в директорию"""
-        if not args:
-            print("Использование: cd <path>")
-            return
-        
-        path = args[0]
-        
-        if path == "..":
-            # Подъем на уровень вверх
-            current = self.state.get_current_relative_path()
-            if current:
-                parent = str(Path(current).parent)
-                self.state.current_path = parent if parent != "." else "."
-            else:
-                self.state.current_path = "."
-        else:
-            # Объединяем текущий путь с новым
-            current = self.state.get_current_relative_path()
-            if current:
-                new_path = str(Path(current) / path)
-            else:
-                new_path = path
-            
-            # Проверяем существование
-            try:
-                full_path = resolve_secure_path(new_path)
-                if full_path.exists() and full_path.is_dir():
-                    self.state.current_path = new_path
-                else:
-                    print(f"Директория '{new_path}' не найдена")
-            except Exception as e:
-                print(f"Ошибка: {e}")
-    
-    def cmd_clear(self):
-        """Очистка экрана"""
-        import os
-        os.system("cls" if os.name == "nt" else "clear")
-    
-    async def cmd_disk(self):
-        """Информация о дисках"""
-        try:
-            disks = get_disk_info()
-            for disk in disks:
-                print(f"\nДиск: {disk.get('name', disk.get('mountpoint', 'N/A'))}")
-                print(f"  Всего: {format_bytes(disk['total'])}")
-                print(f"  Использовано: {format_bytes(disk['used'])} ({disk['usage_percent']:.1f}%)")
-                print(f"  Свободно: {format_bytes(disk['free'])}")
-        except Exception as e:
-            print(f"Ошибка получения информации о дисках: {e}")
-            print("Примечание: Для Windows требуется pywin32, для Linux - psutil")
-    
-    async def cmd_touch(self, args: list):
-        """Создание файла"""
-        if not args:
-            print("Использование: touch <name>")
-            return
-        
-        if not self.state.current_user_id:
-            print("Необходимо войти в систему")
-            return
-        
-        name = args[0]
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            await file_manager.create_file(full_name, self.state.current_user_id)
-            print(f"Файл '{name}' создан")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_rm(self, args: list):
-        """Удаление файла"""
-        if not args:
-            print("Использование: rm <name>")
-            return
-        
-        if not self.state.current_user_id:
-            print("Необходимо войти в систему")
-            return
-        
-        name = args[0]
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            await file_manager.delete_file(full_name, self.state.current_user_id)
-            print(f"Файл '{name}' удален")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_cat(self, args: list):
-        """Показать содержимое файла"""
-        if not args:
-            print("Использование: cat <name>")
-            return
-        
-        name = args[0]
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            content = await file_manager.read_file(full_name)
-            print(content)
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_wr(self, args: list):
-        """Запись в файл"""
-        if len(args) < 2:
-            print("Использование: wr <name> <content>")
-            return
-        
-        if not self.state.current_user_id:
-            print("Необходимо войти в систему")
-            return
-        
-        name = args[0]
-        content = " ".join(args[1:])
-        
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            await file_manager.write_file(full_name, content, self.state.current_user_id, append=True)
-            print(f"Содержимое записано в '{name}'")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_mkdir(self, args: list):
-        """Создание директории"""
-        if not args:
-            print("Использование: mkdir <name>")
-            return
-        
-        name = args[0]
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            await file_manager.create_directory(full_name)
-            print(f"Директория '{name}' создана")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_rmdir(self, args: list):
-        """Удаление директории"""
-        if not args:
-            print("Использование: rmdir <name> [-r]")
-            return
-        
-        recursive = "-r" in args or "--recursive" in args
-        name = args[0] if args[0] not in ["-r", "--recursive"] else args[1] if len(args) > 1 else None
-        
-        if not name:
-            print("Использование: rmdir <name> [-r]")
-            return
-        
-        current = self.state.get_current_relative_path()
-        if current:
-            full_name = str(Path(current) / name)
-        else:
-            full_name = name
-        
-        try:
-            await file_manager.delete_directory(full_name, recursive=recursive)
-            print(f"Директория '{name}' удалена")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_mv(self, args: list):
-        """Перемещение файла или директории"""
-        if len(args) < 2:
-            print("Использование: mv <source> <destination>")
-            return
-        
-        source = args[0]
-        dest = args[1]
-        
-        current = self.state.get_current_relative_path()
-        if current:
-            source_full = str(Path(current) / source)
-            dest_full = str(Path(current) / dest)
-        else:
-            source_full = source
-            dest_full = dest
-        
-        try:
-            await file_manager.move(source_full, dest_full)
-            print(f"'{source}' перемещен в '{dest}'")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_zip(self, args: list):
-        """Создание ZIP архива"""
-        if len(args) < 2:
-            print("Использование: zip <archive> <src...>")
-            return
-        
-        if not self.state.current_user_id:
-            print("Необходимо войти в систему")
-            return
-        
-        archive = args[0]
-        sources = args[1:]
-        
-        current = self.state.get_current_relative_path()
-        if current:
-            archive_full = str(Path(current) / archive)
-            sources_full = [str(Path(current) / s) for s in sources]
-        else:
-            archive_full = archive
-            sources_full = sources
-        
-        try:
-            await file_manager.create_zip(archive_full, sources_full, self.state.current_user_id)
-            print(f"Архив '{archive}' создан")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def cmd_unzip(self, args: list):
-        """Распаковка ZIP архива"""
-        if len(args) < 2:
-            print("Использование: unzip <archive> <destination>")
-            return
-        
-        archive = args[0]
-        destination = args[1]
-        
-        current = self.state.get_current_relative_path()
-        if current:
-            archive_full = str(Path(current) / archive)
-            dest_full = str(Path(current) / destination)
-        else:
-            archive_full = archive
-            dest_full = destination
-        
-        try:
-            files = await file_manager.extract_zip(archive_full, dest_full)
-            print(f"Архив '{archive}' распакован в '{destination}' ({len(files)} файлов)")
-        except Exception as e:
-            print(f"Ошибка: {e}")
-    
-    async def run(self):
-        """Запуск приложения"""
-        await self.initialize()
-        
-        try:
-            while self.running:
-                try:
-                    self.print_prompt()
-                    command_line = input().strip()
-                    if command_line:
-                        await self.handle_command(command_line)
-                except EOFError:
-                    print("\nВыход...")
-                    break
-                except KeyboardInterrupt:
-                    print("\nВыход...")
-                    break
-        finally:
-            await self.cleanup()
-
+
+import asyncio
+import inspect
+import json
+import os
+import shlex
+import stat
+import sys
+from pathlib import Path, PurePosixPath
+from typing import Optional
+
+try:
+    from prompt_toolkit import PromptSession
+    from prompt_toolkit.patch_stdout import patch_stdout
+except ImportError:
+    # Fallback на блокирующий input() если prompt_toolkit не установлен
+    PromptSession = None
+    patch_stdout = None
+
+from src.cli.early_input import drain_early_input
+from src.core.config import config
+from src.core.security import resolve_secure_path, clear_path_cache
+
+# Тяжелые модули (SQLAlchemy, bcrypt, psutil) импортируются лениво
+# внутри команд, чтобы не замедлять старт CLI
+
+
+_HELP_TEXT = """
+Доступные команды:
+
+Пользователи:
+  register              - Регистрация нового пользователя
+  login                 - Вход в систему
+  logout                - Выход из системы
+
+Навигация:
+  pwd                   - Показать текущий путь
+  ls [path]             - Список файлов и директорий
+  cd <path>             - Перейти в директорию (используйте '..' для подъема)
+  clear                 - Очистить экран
+
+Диски:
+  disk                  - Информация о дисках системы
+
+Файлы:
+  touch <name>          - Создать файл
+  rm <name>             - Удалить файл
+  cat <name>            - Показать содержимое файла
+  wr <name> <content>   - Записать/добавить содержимое в файл
+
+Директории:
+  mkdir <name>          - Создать директорию
+  rmdir <name> [-r]     - Удалить директорию (используйте -r для рекурсивного удаления)
+
+Операции:
+  mv <source> <dest>    - Переместить файл или директорию
+  zip <archive> <src...> - Создать ZIP архив
+  unzip <archive> <dest> [-r] - Распаковать ZIP архив (-r — включая вложенные)
+
+Прочее:
+  help                  - Показать эту справку
+  exit                  - Выход из программы
+"""
+
+
+_ROOT = PurePosixPath(".")
+
+
+class ApplicationState:
+    """Состояние приложения"""
+    def __init__(self):
+        self.current_user_id: Optional[int] = None
+        self._current_path: PurePosixPath = _ROOT
+        self.cached_prompt: str = "/> "
+
+    @property
+    def current_path(self) -> PurePosixPath:
+        return self._current_path
+
+    @current_path.setter
+    def current_path(self, value):
+        # Путь хранится как PurePosixPath: никаких повторных
+        # str -> Path -> str преобразований в командах
+        self._current_path = PurePosixPath(value)
+        rel = "" if self._current_path == _ROOT else self._current_path.as_posix()
+        # Строка приглашения пересчитывается один раз при смене директории
+        self.cached_prompt = f"{rel}> " if rel else "/> "
+
+    def resolve_name(self, name: str) -> str:
+        """Построить путь от текущей директории до name"""
+        return (self._current_path / name).as_posix()
+
+    def get_current_relative_path(self) -> str:
+        """Получить текущий относительный путь"""
+        return "" if self._current_path == _ROOT else self._current_path.as_posix()
+
+
+class CLIApplication:
+    """Интерактивное CLI приложение"""
+    
+    def __init__(self):
+        self.state = ApplicationState()
+        self.running = True
+
+        # Асинхронный ввод: input() блокировал бы весь event loop
+        self._session = None
+        if PromptSession is not None:
+            try:
+                self._session = PromptSession()
+            except Exception:
+                self._session = None
+
+        # Таблица диспетчеризации команд: O(1) поиск вместо цепочки if/elif
+        self._dispatch = {
+            "exit": self.cmd_exit,
+            "help": self.print_help,
+            "register": self.cmd_register,
+            "login": self.cmd_login,
+            "logout": self.cmd_logout,
+            "pwd": self.cmd_pwd,
+            "ls": self.cmd_ls,
+            "cd": self.cmd_cd,
+            "clear": self.cmd_clear,
+            "disk": self.cmd_disk,
+            "touch": self.cmd_touch,
+            "rm": self.cmd_rm,
+            "cat": self.cmd_cat,
+            "wr": self.cmd_wr,
+            "mkdir": self.cmd_mkdir,
+            "rmdir": self.cmd_rmdir,
+            "mv": self.cmd_mv,
+            "zip": self.cmd_zip,
+            "unzip": self.cmd_unzip,
+        }
+        # Команды, не принимающие аргументов
+        self._no_arg_commands = {
+            "exit", "help", "register", "login", "logout", "pwd", "clear", "disk"
+        }
+
+    async def initialize(self):
+        """Инициализация приложения"""
+        from src.core.database import db
+
+        await db.connect()
+
+        # Прогрев пула соединений, чтобы первая команда не платила
+        # за холодное подключение к Postgres
+        await db.warm_pool()
+
+        # Создание таблиц (кэшируется через файл-маркер с версией схемы,
+        # чтобы не гонять create_all при каждом запуске)
+        if db._engine and self._schema_is_stale():
+            from src.core.models import Base
+
+            async with db._engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            self._write_schema_marker()
+
+        # Фоновый батчер журнала операций
+        from src.operations.logger import start_operation_writer
+
+        start_operation_writer()
+
+        print("Безопасный файловый менеджер")
+        print("Введите 'help' для списка команд или 'exit' для выхода")
+        print()
+    
+    def _schema_marker_path(self) -> Path:
+        """Путь к файлу-маркеру версии схемы"""
+        return config.SANDBOX_ROOT / ".schema_version"
+
+    def _schema_is_stale(self) -> bool:
+        """Проверить, нужно ли запускать create_all"""
+        from src.core.models import SCHEMA_VERSION
+
+        if os.getenv("BPO_REFRESH_SCHEMA"):
+            return True
+
+        try:
+            data = json.loads(self._schema_marker_path().read_text(encoding='utf-8'))
+            return data.get("schema_version") != SCHEMA_VERSION
+        except (OSError, ValueError):
+            return True
+
+    def _write_schema_marker(self):
+        """Записать текущую версию схемы в файл-маркер"""
+        from src.core.models import SCHEMA_VERSION
+
+        try:
+            config.SANDBOX_ROOT.mkdir(parents=True, exist_ok=True)
+            self._schema_marker_path().write_text(
+                json.dumps({"schema_version": SCHEMA_VERSION}),
+                encoding='utf-8',
+            )
+        except OSError:
+            # Не критично: в худшем случае create_all выполнится снова
+            pass
+
+    async def cleanup(self):
+        """Очистка ресурсов"""
+        from src.core.database import db
+        from src.operations.logger import stop_operation_writer
+
+        # Дописываем очередь журнала до закрытия соединений
+        await stop_operation_writer()
+        await db.disconnect()
+    
+    def _prompt_str(self) -> str:
+        """Строка приглашения к вводу"""
+        return self.state.cached_prompt
+
+    def print_prompt(self):
+        """Вывод приглашения к вводу"""
+        sys.stdout.write(self._prompt_str())
+        sys.stdout.flush()
+
+    async def read_command_line(self) -> str:
+        """Асинхронное чтение строки команды"""
+        # Набранное во время инициализации подставляется в первое приглашение
+        early = drain_early_input()
+
+        if self._session is not None:
+            with patch_stdout():
+                return (
+                    await self._session.prompt_async(self._prompt_str(), default=early)
+                ).strip()
+
+        self.print_prompt()
+        if early:
+            # Без prompt_toolkit подставить ранний ввод в редактируемую
+            # строку нельзя; эхо + конкатенация, иначе захваченные в
+            # cbreak-режиме нажатия просто пропали бы
+            sys.stdout.write(early)
+            sys.stdout.flush()
+            return (early + input()).strip()
+        return input().strip()
+
+    async def handle_command(self, command_line: str):
+        """Обработка команды"""
+        if not command_line.strip():
+            return
+        
+        # Быстрый путь: shlex нужен только строкам с кавычками/экранированием
+        if "'" in command_line or '"' in command_line or "\\" in command_line:
+            parts = shlex.split(command_line)
+        else:
+            parts = command_line.split()
+        if not parts:
+            return
+        
+        cmd = parts[0].lower()
+        args = parts[1:]
+        
+        handler = self._dispatch.get(cmd)
+        if handler is None:
+            print(f"Неизвестная команда: {cmd}. Введите 'help' для списка команд.")
+            return
+
+        try:
+            result = handler() if cmd in self._no_arg_commands else handler(args)
+            if inspect.iscoroutine(result):
+                await result
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    def cmd_exit(self):
+        """Выход из программы"""
+        self.running = False
+
+    def print_help(self):
+        """Вывод справки"""
+        print(_HELP_TEXT)
+    
+    async def cmd_register(self):
+        """Регистрация пользователя"""
+        username = input("Введите логин: ").strip()
+        if not username:
+            print("Логин не может быть пустым")
+            return
+        
+        password = await self.get_password("Введите пароль: ")
+        password2 = await self.get_password("Повторите пароль: ")
+        
+        if password != password2:
+            print("Пароли не совпадают")
+            return
+        
+        try:
+            from src.users.auth import create_user
+
+            user = await create_user(username, password)
+            print(f"Пользователь '{username}' успешно зарегистрирован")
+        except ValueError as e:
+            print(f"Ошибка регистрации: {e}")
+    
+    async def cmd_login(self):
+        """Вход в систему"""
+        username = input("Введите логин: ").strip()
+        password = await self.get_password("Введите пароль: ")
+
+        from src.users.auth import authenticate_user
+
+        user = await authenticate_user(username, password)
+        if user:
+            self.state.current_user_id = user.id
+            print(f"Добро пожаловать, {username}!")
+        else:
+            print("Неверный логин или пароль")
+    
+    async def cmd_logout(self):
+        """Выход из системы"""
+        self.state.current_user_id = None
+        print("Вы вышли из системы")
+    
+    async def get_password(self, prompt: str) -> str:
+        """Безопасный ввод пароля"""
+        if self._session is not None:
+            return await self._session.prompt_async(prompt, is_password=True)
+
+        import getpass
+        return getpass.getpass(prompt)
+    
+    async def cmd_pwd(self):
+        """Показать текущий путь"""
+        path = self.state.get_current_relative_path()
+        print(path if path else "/")
+    
+    async def cmd_ls(self, args: list):
+        """Список файлов и директорий"""
+        path = args[0] if args else self.state.get_current_relative_path()
+        if not path:
+            path = "."
+        
+        try:
+            from src.files.manager import file_manager
+            from src.system.disks import format_bytes
+
+            items = await file_manager.list_directory(path)
+            # Один write() на весь листинг вместо print() на каждую строку
+            lines = []
+            for item in items:
+                if item["type"] == "directory":
+                    lines.append(f"[DIR]  {item['name']}")
+                else:
+                    size_str = format_bytes(item["size"])
+                    lines.append(f"       {item['name']:<30} {size_str:>10}")
+            if lines:
+                sys.stdout.write("\n".join(lines) + "\n")
+                sys.stdout.flush()
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_cd(self, args: list):
+        """Переход в директорию"""
+        if not args:
+            print("Использование: cd <path>")
+            return
+        
+        path = args[0]
+        
+        if path == "..":
+            # Подъем на уровень вверх
+            self.state.current_path = self.state.current_path.parent
+        else:
+            # Объединяем текущий путь с новым
+            new_path = self.state.resolve_name(path)
+
+            # Проверяем существование одним stat() вместо exists() + is_dir()
+            try:
+                full_path = resolve_secure_path(new_path)
+                try:
+                    st = os.stat(full_path)
+                except FileNotFoundError:
+                    print(f"Директория '{new_path}' не найдена")
+                    return
+
+                if stat.S_ISDIR(st.st_mode):
+                    self.state.current_path = new_path
+                    # Сбрасываем кэш разрешенных путей после смены директории
+                    clear_path_cache()
+                else:
+                    print(f"Директория '{new_path}' не найдена")
+            except Exception as e:
+                print(f"Ошибка: {e}")
+    
+    def cmd_clear(self):
+        """Очистка экрана"""
+        import os
+        os.system("cls" if os.name == "nt" else "clear")
+    
+    async def cmd_disk(self):
+        """Информация о дисках"""
+        try:
+            from src.system.disks import get_disk_info_async, format_bytes
+
+            disks = await get_disk_info_async()
+            for disk in disks:
+                print(f"\nДиск: {disk.get('name', disk.get('mountpoint', 'N/A'))}")
+                print(f"  Всего: {format_bytes(disk['total'])}")
+                print(f"  Использовано: {format_bytes(disk['used'])} ({disk['usage_percent']:.1f}%)")
+                print(f"  Свободно: {format_bytes(disk['free'])}")
+        except Exception as e:
+            print(f"Ошибка получения информации о дисках: {e}")
+            print("Примечание: Для Windows требуется pywin32, для Linux - psutil")
+    
+    async def cmd_touch(self, args: list):
+        """Создание файла"""
+        if not args:
+            print("Использование: touch <name>")
+            return
+        
+        if not self.state.current_user_id:
+            print("Необходимо войти в систему")
+            return
+        
+        name = args[0]
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.create_file(full_name, self.state.current_user_id)
+            print(f"Файл '{name}' создан")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_rm(self, args: list):
+        """Удаление файла"""
+        if not args:
+            print("Использование: rm <name>")
+            return
+        
+        if not self.state.current_user_id:
+            print("Необходимо войти в систему")
+            return
+        
+        name = args[0]
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.delete_file(full_name, self.state.current_user_id)
+            print(f"Файл '{name}' удален")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_cat(self, args: list):
+        """Показать содержимое файла"""
+        if not args:
+            print("Использование: cat <name>")
+            return
+        
+        name = args[0]
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            content = await file_manager.read_file(full_name)
+            print(content)
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_wr(self, args: list):
+        """Запись в файл"""
+        if len(args) < 2:
+            print("Использование: wr <name> <content>")
+            return
+        
+        if not self.state.current_user_id:
+            print("Необходимо войти в систему")
+            return
+        
+        name = args[0]
+        content = " ".join(args[1:])
+        
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.write_file(full_name, content, self.state.current_user_id, append=True)
+            print(f"Содержимое записано в '{name}'")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_mkdir(self, args: list):
+        """Создание директории"""
+        if not args:
+            print("Использование: mkdir <name>")
+            return
+        
+        name = args[0]
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.create_directory(full_name)
+            print(f"Директория '{name}' создана")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_rmdir(self, args: list):
+        """Удаление директории"""
+        if not args:
+            print("Использование: rmdir <name> [-r]")
+            return
+        
+        # Один проход по аргументам вместо трех сканирований списка
+        recursive = False
+        name = None
+        for arg in args:
+            if arg in ("-r", "--recursive"):
+                recursive = True
+            elif name is None:
+                name = arg
+
+        if not name:
+            print("Использование: rmdir <name> [-r]")
+            return
+        
+        full_name = self.state.resolve_name(name)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.delete_directory(full_name, recursive=recursive)
+            print(f"Директория '{name}' удалена")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_mv(self, args: list):
+        """Перемещение файла или директории"""
+        if len(args) < 2:
+            print("Использование: mv <source> <destination>")
+            return
+        
+        source = args[0]
+        dest = args[1]
+        
+        source_full = self.state.resolve_name(source)
+        dest_full = self.state.resolve_name(dest)
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.move(source_full, dest_full)
+            print(f"'{source}' перемещен в '{dest}'")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_zip(self, args: list):
+        """Создание ZIP архива"""
+        if len(args) < 2:
+            print("Использование: zip <archive> <src...>")
+            return
+        
+        if not self.state.current_user_id:
+            print("Необходимо войти в систему")
+            return
+        
+        archive = args[0]
+        sources = args[1:]
+        
+        archive_full = self.state.resolve_name(archive)
+        sources_full = [self.state.resolve_name(s) for s in sources]
+        
+        try:
+            from src.files.manager import file_manager
+
+            await file_manager.create_zip(archive_full, sources_full, self.state.current_user_id)
+            print(f"Архив '{archive}' создан")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def cmd_unzip(self, args: list):
+        """Распаковка ZIP архива"""
+        # Разбор флагов одним проходом, как в cmd_rmdir
+        recursive = False
+        positional = []
+        for arg in args:
+            if arg in ("-r", "--recursive"):
+                recursive = True
+            else:
+                positional.append(arg)
+
+        if len(positional) < 2:
+            print("Использование: unzip <archive> <destination> [-r]")
+            return
+
+        archive = positional[0]
+        destination = positional[1]
+
+        archive_full = self.state.resolve_name(archive)
+        dest_full = self.state.resolve_name(destination)
+
+        try:
+            from src.files.manager import file_manager
+
+            files = await file_manager.extract_zip(
+                archive_full, dest_full, recurse_nested=recursive
+            )
+            print(f"Архив '{archive}' распакован в '{destination}' ({len(files)} файлов)")
+        except Exception as e:
+            print(f"Ошибка: {e}")
+    
+    async def run(self):
+        """Запуск приложения"""
+        await self.initialize()
+        
+        try:
+            while self.running:
+                try:
+                    command_line = await self.read_command_line()
+                    if command_line:
+                        await self.handle_command(command_line)
+                except EOFError:
+                    print("\nВыход...")
+                    break
+                except KeyboardInterrupt:
+                    print("\nВыход...")
+                    break
+        finally:
+            await self.cleanup()
+
@@ -0,0 +1,95 @@
+"""Захват ранних нажатий клавиш во время инициализации приложения.
+
+Пока initialize() подключается к БД, терминал находится в каноническом
+режиме и набранные символы теряются. Фоновый поток переводит stdin в
+cbreak-режим и накапливает ввод, который затем подставляется в первое
+приглашение REPL.
+"""
+import os
+import sys
+import threading
+
+_buffer: list[str] = []
+_thread: threading.Thread | None = None
+_stop = threading.Event()
+_old_settings = None
+
+
+def start_capturing_early_input() -> None:
+    """Начать фоновый захват ввода с терминала.
+
+    Безопасно вызывать на не-TTY stdin или на платформах без termios —
+    в этом случае функция ничего не делает.
+    """
+    global _thread, _old_settings
+
+    if _thread is not None:
+        return
+
+    try:
+        if not sys.stdin.isatty():
+            return
+        import termios
+        import tty
+    except (ImportError, ValueError, OSError):
+        return
+
+    fd = sys.stdin.fileno()
+    try:
+        _old_settings = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+    except termios.error:
+        _old_settings = None
+        return
+
+    def _reader():
+        import select
+        while not _stop.is_set():
+            ready, _, _ = select.select([fd], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                data = os.read(fd, 1024)
+            except OSError:
+                break
+            if not data:
+                break
+            _buffer.append(data.decode('utf-8', errors='ignore'))
+
+    _thread = threading.Thread(target=_reader, daemon=True)
+    _thread.start()
+
+
+def restore_terminal() -> None:
+    """Остановить захват и вернуть терминал в исходный режим.
+
+    Идемпотентна и безопасна в любом состоянии: вызывается не только из
+    drain_early_input(), но и из finally в main() — иначе падение
+    инициализации (например, недоступный Postgres) оставило бы shell
+    пользователя в cbreak-режиме без эха.
+    """
+    global _thread, _old_settings
+
+    if _thread is not None:
+        _stop.set()
+        _thread.join(timeout=0.2)
+        _thread = None
+
+    if _old_settings is not None:
+        import termios
+        try:
+            termios.tcsetattr(sys.stdin.fileno(), termios.TCSADRAIN, _old_settings)
+        except termios.error:
+            pass
+        _old_settings = None
+
+
+def drain_early_input() -> str:
+    """Остановить захват, восстановить терминал и вернуть накопленный ввод"""
+    restore_terminal()
+
+    text = "".join(_buffer)
+    _buffer.clear()
+    # Переводы строк отбрасываем: текст подставляется как default
+    # в приглашение, а не исполняется немедленно
+    return text.replace("\r", "").replace("\n", "")
@@ -1,4 +1,6 @@
 """Модуль безопасной работы с ZIP архивами (защита от ZIP-бомб)"""
+import os
+import shutil
 import zipfile
 from pathlib import Path
 from typing import List
@@ -11,6 +13,14 @@ class ArchiveSecurityError(Exception):
     pass
 
 
+# Расширения уже сжатых форматов: deflate на них только тратит CPU
+_STORED_EXTENSIONS = frozenset({
+    ".zip", ".gz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp",
+    ".mp3", ".mp4", ".mkv", ".avi", ".webm",
+})
+
+
 def validate_zip_entry(entry: zipfile.ZipInfo) -> None:
     """
     Валидация записи в ZIP архиве на предмет ZIP-бомбы.
@@ -90,15 +100,17 @@ def safe_extract_zip(
     zip_path: Path,
     destination: Path,
     max_depth: int = None,
+    recurse_nested: bool = False,
 ) -> List[Path]:
     """
     Безопасная распаковка ZIP архива с защитой от ZIP-бомб и Zip Slip.
-    
+
     Args:
         zip_path: Путь к ZIP архиву
         destination: Путь назначения
         max_depth: Максимальная глубина вложенности (по умолчанию из config)
-        
+        recurse_nested: Распаковывать ли вложенные ZIP архивы
+
     Returns:
         Список распакованных файлов
         
@@ -111,19 +123,35 @@ def safe_extract_zip(
     if max_depth <= 0:
         raise ArchiveSecurityError("Превышена максимальная глубина вложенности архивов")
     
-    # Валидация архива перед распаковкой
-    validate_zip_file(zip_path)
-    
     # Безопасное разрешение пути назначения
     dest_path = resolve_secure_path(str(destination))
     dest_path.mkdir(parents=True, exist_ok=True)
     
     extracted_files = []
+    extracted_total = 0
+    file_count = 0
     dest_resolved = dest_path.resolve()
-    
+    # Префикс для проверки Zip Slip вычисляется один раз:
+    # нормализация строки не требует stat() на каждую запись
+    dest_prefix = str(dest_resolved) + os.sep
+
     try:
+        # Один проход по центральному каталогу: валидация записей
+        # выполняется прямо в цикле распаковки
         with zipfile.ZipFile(zip_path, 'r') as zf:
-            for entry in zf.namelist():
+            for entry_info in zf.infolist():
+                entry = entry_info.filename
+
+                file_count += 1
+                if file_count > config.ZIP_MAX_FILES:
+                    raise ArchiveSecurityError(
+                        f"Превышено максимальное количество файлов в архиве "
+                        f"({config.ZIP_MAX_FILES})"
+                    )
+
+                # Валидация записи (коэффициент сжатия и т.п.)
+                validate_zip_entry(entry_info)
+
                 # Защита от Zip Slip (Path Traversal в архивах)
                 # Нормализуем путь и проверяем, что он внутри destination
                 entry_path = Path(entry)
@@ -131,21 +159,16 @@ def safe_extract_zip(
                     raise ArchiveSecurityError(
                         f"Обнаружена попытка Zip Slip: '{entry}'"
                     )
-                
-                full_entry_path = (dest_path / entry_path).resolve()
-                
+
                 # Критическая проверка: путь должен быть внутри destination
-                if not str(full_entry_path).startswith(str(dest_resolved)):
+                candidate = os.path.normpath(os.path.join(dest_prefix, entry))
+                if not candidate.startswith(dest_prefix):
                     raise ArchiveSecurityError(
                         f"Обнаружена попытка выхода за пределы назначения: '{entry}'"
                     )
-                
-                # Получаем информацию о записи
-                entry_info = zf.getinfo(entry)
-                
-                # Дополнительная валидация
-                validate_zip_entry(entry_info)
-                
+
+                full_entry_path = Path(candidate)
+
                 # Создаем директории если нужно
                 if entry.endswith('/'):
                     full_entry_path.mkdir(parents=True, exist_ok=True)
@@ -153,36 +176,30 @@ def safe_extract_zip(
                     # Создаем родительские директории
                     full_entry_path.parent.mkdir(parents=True, exist_ok=True)
                     
-                    # Распаковываем файл с проверкой размера
+                    # Проверка размера до распаковки по заявленному размеру
+                    if entry_info.file_size > config.ZIP_MAX_TOTAL_SIZE - extracted_total:
+                        raise ArchiveSecurityError(
+                            "Превышен максимальный размер распаковки"
+                        )
+
+                    # Распаковка через C-цикл с буфером 1 MiB вместо
+                    # Python-цикла по 8 KiB
                     with zf.open(entry) as source:
                         with open(full_entry_path, 'wb') as target:
-                            # Читаем порциями для контроля размера
-                            total_size = 0
-                            chunk_size = 8192
-                            
-                            while True:
-                                chunk = source.read(chunk_size)
-                                if not chunk:
-                                    break
-                                
-                                total_size += len(chunk)
-                                if total_size > config.ZIP_MAX_TOTAL_SIZE:
-                                    raise ArchiveSecurityError(
-                                        "Превышен максимальный размер распаковки"
-                                    )
-                                
-                                target.write(chunk)
-                    
+                            shutil.copyfileobj(source, target, length=1024 * 1024)
+
+                    extracted_total += entry_info.file_size
                     extracted_files.append(full_entry_path)
                     
-                    # Проверка на вложенные архивы
-                    if entry.lower().endswith('.zip'):
+                    # Вложенные архивы распаковываются только по явному запросу
+                    if recurse_nested and entry.lower().endswith('.zip'):
                         # Рекурсивная распаковка с уменьшенной глубиной
                         extracted_files.extend(
                             safe_extract_zip(
                                 full_entry_path,
                                 full_entry_path.parent / full_entry_path.stem,
-                                max_depth - 1
+                                max_depth - 1,
+                                recurse_nested=True,
                             )
                         )
     
@@ -192,6 +209,31 @@ def safe_extract_zip(
     return extracted_files
 
 
+def _scan_tree(root: Path):
+    """
+    Рекурсивный обход дерева файлов через os.scandir.
+
+    Использует кэшированные в DirEntry результаты stat, что дает
+    ~1 syscall на файл вместо ~3 у rglob + is_file + stat.
+
+    Yields:
+        Кортежи (путь к файлу, размер в байтах)
+    """
+    with os.scandir(root) as it:
+        for dir_entry in it:
+            if dir_entry.is_file(follow_symlinks=False):
+                yield Path(dir_entry.path), dir_entry.stat(follow_symlinks=False).st_size
+            elif dir_entry.is_dir(follow_symlinks=False):
+                yield from _scan_tree(Path(dir_entry.path))
+
+
+def _compress_type(path: Path) -> int:
+    """Выбрать метод сжатия: STORED для уже сжатых форматов"""
+    if path.suffix.lower() in _STORED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
 def safe_create_zip(
     sources: List[Path],
     destination: Path,
@@ -213,49 +255,52 @@ def safe_create_zip(
     dest_path = resolve_secure_path(str(destination))
     validate_filename(dest_path.name)
     
-    # Проверка источников
+    # Проверка источников: один обход дерева, список (путь, arcname)
+    # материализуется для фазы записи
     total_size = 0
     file_count = 0
-    
+    plan: List[tuple] = []
+
+    def _account(file_path: Path, file_size: int, arcname) -> None:
+        nonlocal total_size, file_count
+        file_count += 1
+        total_size += file_size
+
+        if file_count > config.ZIP_MAX_FILES:
+            raise ArchiveSecurityError(
+                f"Превышено максимальное количество файлов ({config.ZIP_MAX_FILES})"
+            )
+
+        if total_size > config.ZIP_MAX_TOTAL_SIZE:
+            raise ArchiveSecurityError(
+                f"Превышен максимальный размер для архивации ({config.ZIP_MAX_TOTAL_SIZE} байт)"
+            )
+
+        plan.append((file_path, arcname))
+
     for source in sources:
         source_path = resolve_secure_path(str(source))
-        
+
         if source_path.is_file():
-            file_count += 1
-            total_size += source_path.stat().st_size
+            _account(source_path, source_path.stat().st_size, source_path.name)
         elif source_path.is_dir():
             # Рекурсивный подсчет файлов в директории
-            for file_path in source_path.rglob('*'):
-                if file_path.is_file():
-                    file_count += 1
-                    total_size += file_path.stat().st_size
-                    
-                    if file_count > config.ZIP_MAX_FILES:
-                        raise ArchiveSecurityError(
-                            f"Превышено максимальное количество файлов ({config.ZIP_MAX_FILES})"
-                        )
-                    
-                    if total_size > config.ZIP_MAX_TOTAL_SIZE:
-                        raise ArchiveSecurityError(
-                            f"Превышен максимальный размер для архивации ({config.ZIP_MAX_TOTAL_SIZE} байт)"
-                        )
+            for file_path, file_size in _scan_tree(source_path):
+                # Относительный путь внутри архива
+                _account(file_path, file_size,
+                         file_path.relative_to(source_path.parent))
         else:
             raise ArchiveSecurityError(f"Источник не найден: {source}")
-    
-    # Создание архива
+
+    # Создание архива по готовому плану — без повторного обхода дерева
     try:
-        with zipfile.ZipFile(dest_path, 'w', zipfile.ZIP_DEFLATED) as zf:
-            for source in sources:
-                source_path = resolve_secure_path(str(source))
-                
-                if source_path.is_file():
-                    zf.write(source_path, source_path.name)
-                elif source_path.is_dir():
-                    for file_path in source_path.rglob('*'):
-                        if file_path.is_file():
-                            # Относительный путь внутри архива
-                            arcname = file_path.relative_to(source_path.parent)
-                            zf.write(file_path, arcname)
+        with zipfile.ZipFile(
+            dest_path, 'w', zipfile.ZIP_DEFLATED,
+            compresslevel=config.ZIP_COMPRESS_LEVEL,
+        ) as zf:
+            for file_path, arcname in plan:
+                zf.write(file_path, arcname,
+                         compress_type=_compress_type(file_path))
     except Exception as e:
         if dest_path.exists():
             dest_path.unlink()
@@ -1,14 +1,15 @@
 """Модуль для работы с базой данных"""
+import asyncio
 from contextlib import asynccontextmanager
+from sqlalchemy import text
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
     create_async_engine,
     async_sessionmaker,
 )
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 from sqlalchemy.orm import declarative_base
-from asyncio import current_task
-from sqlalchemy.ext.asyncio import async_scoped_session
 from contextvars import ContextVar
 
 from src.core.config import config
@@ -28,15 +29,33 @@ class Database:
     def __init__(self):
         self._engine: AsyncEngine | None = None
         self._session_maker: async_sessionmaker | None = None
+        self._readonly_session_maker: async_sessionmaker | None = None
     
     async def connect(self):
         """Подключение к базе данных"""
         if self._engine is None:
-            self._engine = create_async_engine(
-                config.DATABASE_URL,
-                echo=False,
-                pool_pre_ping=True,
-            )
+            if config.DATABASE_URL.startswith("sqlite"):
+                # SQLite: соединения нельзя разделять между задачами,
+                # поэтому пул отключается
+                self._engine = create_async_engine(
+                    config.DATABASE_URL,
+                    echo=False,
+                    poolclass=NullPool,
+                )
+            else:
+                self._engine = create_async_engine(
+                    config.DATABASE_URL,
+                    echo=False,
+                    poolclass=AsyncAdaptedQueuePool,
+                    pool_size=config.DB_POOL_SIZE,
+                    max_overflow=config.DB_MAX_OVERFLOW,
+                    pool_timeout=config.DB_POOL_TIMEOUT,
+                    pool_recycle=config.DB_POOL_RECYCLE,
+                    pool_pre_ping=True,
+                    # LIFO: горячие соединения переиспользуются первыми,
+                    # простаивающие успевают закрыться по pool_recycle
+                    pool_use_lifo=True,
+                )
         if self._session_maker is None:
             self._session_maker = async_sessionmaker(
                 bind=self._engine,
@@ -45,26 +64,55 @@ class Database:
                 autocommit=False,
                 autoflush=False,
             )
-    
+        if self._readonly_session_maker is None:
+            # Для запросов только на чтение: AUTOCOMMIT снимает
+            # BEGIN/COMMIT round trips; пул соединений общий с движком
+            self._readonly_session_maker = async_sessionmaker(
+                bind=self._engine.execution_options(isolation_level="AUTOCOMMIT"),
+                class_=AsyncSession,
+                expire_on_commit=False,
+                autocommit=False,
+                autoflush=False,
+            )
+
+    async def warm_pool(self, count: int | None = None):
+        """Прогрев пула соединений: открывает несколько соединений параллельно"""
+        if self._engine is None:
+            raise RuntimeError("Database not connected")
+
+        if count is None:
+            count = config.DB_POOL_SIZE
+
+        async def _one():
+            async with self._engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*[_one() for _ in range(count)])
+
     async def disconnect(self):
         """Отключение от базы данных"""
         if self._engine:
             await self._engine.dispose()
             self._engine = None
             self._session_maker = None
+            self._readonly_session_maker = None
     
     @asynccontextmanager
     async def session(self):
         """Контекстный менеджер для сессии БД"""
         if self._session_maker is None:
             raise RuntimeError("Database not connected")
-        
-        scoped_session = async_scoped_session(
-            session_factory=self._session_maker,
-            scopefunc=current_task,
-        )
-        
-        async with scoped_session() as session:
+
+        # Вложенный вызов: переиспользуем сессию вызывающего вместо
+        # нового checkout из пула; фиксация остается за внешним уровнем
+        existing = _current_session.get()
+        if existing is not None:
+            yield existing
+            return
+
+        # async_sessionmaker и так выдает сессию на каждый вызов;
+        # scoped-обертка с реестром на task только добавляла аллокации
+        async with self._session_maker() as session:
             token = _current_session.set(session)
             try:
                 yield session
@@ -74,8 +122,38 @@ class Database:
                 raise
             finally:
                 _current_session.reset(token)
-                await scoped_session.remove()
     
+    @asynccontextmanager
+    async def read_session(self):
+        """Сессия только для чтения: работает в AUTOCOMMIT и не платит
+        за BEGIN/COMMIT. Для SELECT-ов без последующей записи."""
+        if self._readonly_session_maker is None:
+            raise RuntimeError("Database not connected")
+
+        # Внутри открытой транзакции читаем через нее же, чтобы видеть
+        # еще не зафиксированные изменения вызывающего
+        existing = _current_session.get()
+        if existing is not None:
+            yield existing
+            return
+
+        async with self._readonly_session_maker() as session:
+            yield session
+
+    def pool_status(self) -> dict:
+        """Текущее состояние пула соединений — для эмпирической
+        настройки DB_POOL_SIZE/DB_MAX_OVERFLOW под нагрузкой."""
+        if self._engine is None:
+            raise RuntimeError("Database not connected")
+
+        pool = self._engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
     def get_current_session(self) -> AsyncSession | None:
         """Получить текущую сессию из контекста"""
         return _current_session.get()
@@ -1,102 +1,195 @@
-"""Модуль для защиты от Race Conditions через блокировки"""
-import asyncio
-from pathlib import Path
-from typing import Dict, Any, Callable, Awaitable
-from src.core.config import config
-
-
-class LockManager:
-    """Менеджер блокировок для предотвращения race conditions"""
-    
-    def __init__(self):
-        self._locks: Dict[str, asyncio.Lock] = {}
-        self._lock = asyncio.Lock()  # Блокировка для доступа к словарю
-    
-    def _get_lock_key(self, path: Path | str) -> str:
-        """Получить ключ блокировки для пути"""
-        return str(Path(path).resolve())
-    
-    async def _get_lock(self, path: Path | str) -> asyncio.Lock:
-        """Получить или создать блокировку для пути"""
-        key = self._get_lock_key(path)
-        async with self._lock:
-            if key not in self._locks:
-                self._locks[key] = asyncio.Lock()
-            return self._locks[key]
-    
-    async def execute_locked(
-        self,
-        path: Path | str,
-        operation: Callable[[], Awaitable[Any]],
-    ) -> Any:
-        """
-        Выполнить операцию с блокировкой пути.
-        
-        Args:
-            path: Путь для блокировки
-            operation: Асинхронная функция для выполнения
-            
-        Returns:
-            Результат операции
-        """
-        lock = await self._get_lock(path)
-        try:
-            # Пытаемся захватить блокировку с таймаутом
-            if await asyncio.wait_for(lock.acquire(), timeout=config.LOCK_TIMEOUT):
-                try:
-                    return await operation()
-                finally:
-                    lock.release()
-            else:
-                raise TimeoutError(
-                    f"Не удалось заблокировать ресурс '{path}' в течение {config.LOCK_TIMEOUT} секунд"
-                )
-        except asyncio.TimeoutError:
-            raise TimeoutError(
-                f"Ресурс '{path}' заблокирован другой операцией. Попробуйте позже."
-            )
-    
-    async def execute_locked_multi(
-        self,
-        paths: list[Path | str],
-        operation: Callable[[], Awaitable[Any]],
-    ) -> Any:
-        """
-        Выполнить операцию с блокировкой нескольких путей (предотвращение дедлоков).
-        
-        Args:
-            paths: Список путей для блокировки (блокируются в отсортированном порядке)
-            operation: Асинхронная функция для выполнения
-            
-        Returns:
-            Результат операции
-        """
-        # Сортируем пути для предотвращения дедлоков
-        sorted_paths = sorted([self._get_lock_key(p) for p in paths])
-        locks = []
-        
-        try:
-            # Захватываем все блокировки в порядке сортировки
-            for path_key in sorted_paths:
-                lock = await self._get_lock(path_key)
-                if await asyncio.wait_for(lock.acquire(), timeout=config.LOCK_TIMEOUT):
-                    locks.append((path_key, lock))
-                else:
-                    # Освобождаем уже захваченные блокировки
-                    for _, l in locks:
-                        l.release()
-                    raise TimeoutError(
-                        f"Не удалось заблокировать все ресурсы в течение {config.LOCK_TIMEOUT} секунд"
-                    )
-            
-            # Выполняем операцию
-            return await operation()
-        finally:
-            # Освобождаем все блокировки в обратном порядке
-            for _, lock in reversed(locks):
-                lock.release()
-
-
-# Глобальный экземпляр менеджера блокировок
-lock_manager = LockManager()
-
+"""Модуль для защиты от Race Conditions через блокировки"""
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Awaitable
+from src.core.config import config
+
+# Максимальное количество блокировок в реестре: иначе каждый когда-либо
+# затронутый путь навсегда оставляет asyncio.Lock в памяти
+_MAX_LOCKS = 4096
+
+
+class _PathLock(asyncio.Lock):
+    """asyncio.Lock с синхронным захватом незанятой блокировки.
+
+    Даже свободный asyncio.Lock.acquire() создает и прогоняет корутину;
+    try_acquire повторяет его быстрый путь обычным вызовом без await —
+    подавляющее большинство операций захватывает блокировку именно так.
+    """
+
+    def try_acquire(self) -> bool:
+        """Синхронная попытка захвата; False если блокировка занята"""
+        # То же условие, что в начале asyncio.Lock.acquire()
+        if self._locked or (
+            self._waiters and not all(w.cancelled() for w in self._waiters)
+        ):
+            return False
+        self._locked = True
+        return True
+
+
+class LockManager:
+    """Менеджер блокировок для предотвращения race conditions"""
+
+    def __init__(self, max_locks: int = _MAX_LOCKS):
+        self._locks: OrderedDict[str, _PathLock] = OrderedDict()
+        self._max_locks = max_locks
+
+    def _get_lock_key(self, path: Path | str) -> str:
+        """Получить ключ блокировки для пути.
+
+        realpath единообразно разрешает символические ссылки, чтобы
+        один и тот же ресурс всегда давал один и тот же ключ
+        независимо от контекста вызова.
+        """
+        return os.path.realpath(os.fspath(path))
+
+    @staticmethod
+    def _stable_order(key: str) -> tuple[bytes, str]:
+        """Стабильный ключ сортировки, не зависящий от локали"""
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), key
+
+    def _get_lock(self, path: Path | str) -> _PathLock:
+        """Получить или создать блокировку для пути.
+
+        Event loop однопоточный и между проверкой и вставкой нет await,
+        поэтому отдельный мьютекс для реестра не нужен. Реестр ограничен
+        по размеру: давно не использовавшиеся свободные блокировки
+        вытесняются в порядке LRU.
+        """
+        key = self._get_lock_key(path)
+        lock = self._locks.get(key)
+
+        if lock is None:
+            lock = _PathLock()
+            self._locks[key] = lock
+            if len(self._locks) > self._max_locks:
+                self._evict_oldest()
+        else:
+            self._locks.move_to_end(key)
+
+        return lock
+
+    def _evict_oldest(self) -> None:
+        """Вытеснить самые старые незанятые блокировки из реестра"""
+        for old_key in list(self._locks):
+            if len(self._locks) <= self._max_locks:
+                break
+            lock = self._locks[old_key]
+            # Пропускаем не только занятые, но и ожидаемые блокировки:
+            # в окне передачи release() -> пробуждение _locked уже False,
+            # а разбуженный еще числится в _waiters. Вытеснить такую —
+            # значит выдать следующему вызывающему новый объект и
+            # получить двух держателей одного пути
+            if not lock.locked() and not lock._waiters:
+                del self._locks[old_key]
+    
+    async def execute_locked(
+        self,
+        path: Path | str,
+        operation: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Выполнить операцию с блокировкой пути.
+        
+        Args:
+            path: Путь для блокировки
+            operation: Асинхронная функция для выполнения
+            
+        Returns:
+            Результат операции
+        """
+        lock = self._get_lock(path)
+
+        if not lock.try_acquire():
+            # asyncio.timeout() вешает таймаут на текущую задачу и не
+            # создает вспомогательную Task, в отличие от wait_for; заодно
+            # исключается потеря блокировки при отмене в момент захвата
+            try:
+                async with asyncio.timeout(config.LOCK_TIMEOUT):
+                    await lock.acquire()
+            except TimeoutError:
+                raise TimeoutError(
+                    f"Ресурс '{path}' заблокирован другой операцией. Попробуйте позже."
+                )
+
+        try:
+            return await operation()
+        finally:
+            lock.release()
+    
+    async def execute_locked_multi(
+        self,
+        paths: list[Path | str],
+        operation: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Выполнить операцию с блокировкой нескольких путей (предотвращение дедлоков).
+        
+        Args:
+            paths: Список путей для блокировки (блокируются в отсортированном порядке)
+            operation: Асинхронная функция для выполнения
+            
+        Returns:
+            Результат операции
+        """
+        # Сортируем пути по стабильному хешу для предотвращения дедлоков:
+        # порядок захвата одинаков у всех вызывающих
+        sorted_paths = sorted(
+            [self._get_lock_key(p) for p in paths], key=self._stable_order
+        )
+        acquired: list[_PathLock] = []
+
+        # Двухфазный захват: берем блокировки только если все свободны;
+        # наткнувшись на занятую — отпускаем взятые и повторяем после
+        # экспоненциальной выдержки. Так частично захваченные ресурсы
+        # не висят занятыми, пока мы ждем чужую блокировку.
+        delay = 0.001
+        max_delay = config.LOCK_TIMEOUT / 10
+
+        try:
+            # Один общий таймаут на весь протокол захвата
+            async with asyncio.timeout(config.LOCK_TIMEOUT):
+                while True:
+                    blocked = False
+                    for path_key in sorted_paths:
+                        lock = self._get_lock(path_key)
+                        # Фаза захвата полностью синхронная:
+                        # либо все блокировки взяты, либо ни одной
+                        if not lock.try_acquire():
+                            blocked = True
+                            break
+                        acquired.append(lock)
+
+                    if not blocked:
+                        break
+
+                    for lock in reversed(acquired):
+                        lock.release()
+                    acquired.clear()
+
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, max_delay)
+        except TimeoutError:
+            # Освобождаем захваченное в прерванном раунде
+            for lock in reversed(acquired):
+                lock.release()
+            raise TimeoutError(
+                f"Не удалось заблокировать все ресурсы в течение {config.LOCK_TIMEOUT} секунд"
+            )
+
+        try:
+            # Выполняем операцию
+            return await operation()
+        finally:
+            # Освобождаем все блокировки в обратном порядке
+            for lock in reversed(acquired):
+                lock.release()
+
+
+# Глобальный экземпляр менеджера блокировок
+lock_manager = LockManager()
+
@@ -1,11 +1,15 @@
 """Модели базы данных"""
 from datetime import datetime
-from sqlalchemy import String, Integer, BigInteger, DateTime, ForeignKey, Enum as SQLEnum, func
+from sqlalchemy import String, Integer, BigInteger, DateTime, ForeignKey, Enum as SQLEnum, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from enum import Enum
 
 from src.core.database import Base
 
+# Версия схемы БД: увеличивается при изменении моделей,
+# чтобы кэш создания таблиц инвалидировался при запуске
+SCHEMA_VERSION = 4
+
 
 class OperationType(str, Enum):
     """Типы операций"""
@@ -30,7 +34,12 @@ class User(Base):
 class File(Base):
     """Модель файла"""
     __tablename__ = "files"
-    
+    __table_args__ = (
+        # write_file/delete_file ищут файл по location на каждой записи;
+        # уникальность заодно исключает дубликаты при гонке с create_file
+        Index("ix_files_location", "location", unique=True),
+    )
+
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     filename: Mapped[str] = mapped_column(String(255), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
@@ -46,7 +55,7 @@ class File(Base):
 class Operation(Base):
     """Модель операции"""
     __tablename__ = "operations"
-    
+
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
     timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     operation_type: Mapped[OperationType] = mapped_column(SQLEnum(OperationType), nullable=False)
@@ -57,3 +66,22 @@ class Operation(Base):
     file: Mapped["File"] = relationship(back_populates="operations")
     user: Mapped["User"] = relationship(back_populates="operations")
 
+
+# История операций читается запросами вида WHERE user_id/file_id = ?
+# ORDER BY timestamp DESC, id DESC LIMIT n: составные индексы с DESC
+# позволяют планировщику отдать ровно limit строк обратным сканированием
+# без сортировки; id в хвосте обслуживает кортежный keyset-курсор
+# (timestamp, id) при совпадающих timestamp
+Index(
+    "ix_operations_user_id_ts",
+    Operation.user_id,
+    Operation.timestamp.desc(),
+    Operation.id.desc(),
+)
+Index(
+    "ix_operations_file_id_ts",
+    Operation.file_id,
+    Operation.timestamp.desc(),
+    Operation.id.desc(),
+)
+
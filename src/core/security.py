@@ -1,27 +1,65 @@
 """Модуль безопасности: защита от Path Traversal и другие проверки"""
+import functools
 import os
+import re
 from pathlib import Path
 from src.core.config import config
 
+# Константы валидации имен файлов вынесены на уровень модуля:
+# validate_filename вызывается на каждый create_file, и пересоздавать
+# наборы при каждом вызове незачем
+_INVALID_CHARS = frozenset('<>:"|?*\\')
+_INVALID_CHARS_RE = re.compile(r'[<>:"|?*\\]')
+# Зарезервированные имена (Windows)
+_RESERVED_NAMES = frozenset({
+    'CON', 'PRN', 'AUX', 'NUL',
+    'COM1', 'COM2', 'COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8', 'COM9',
+    'LPT1', 'LPT2', 'LPT3', 'LPT4', 'LPT5', 'LPT6', 'LPT7', 'LPT8', 'LPT9',
+})
+_MAX_FILENAME_LENGTH = config.MAX_FILENAME_LENGTH
+
+# Корень песочницы разрешается один раз при импорте: Path.resolve() —
+# это realpath(), лишний syscall на каждой проверке пути
+_SANDBOX_RESOLVED = config.SANDBOX_ROOT.resolve()
+
+
+@functools.lru_cache(maxsize=1024)
+def _resolve_cached(relative_path: str) -> Path:
+    """Кэшированное разрешение пути относительно песочницы"""
+    return _resolve_path(relative_path, _SANDBOX_RESOLVED)
+
+
+def clear_path_cache() -> None:
+    """Сбросить кэш разрешенных путей (например, после смены директории)"""
+    _resolve_cached.cache_clear()
+
 
 def resolve_secure_path(relative_path: str, base_path: Path = None) -> Path:
     """
     Безопасное разрешение пути с защитой от Path Traversal.
-    
+
+    Результаты для путей относительно песочницы мемоизируются:
+    одни и те же пути разрешаются многократно в течение сессии.
+
     Args:
         relative_path: Относительный путь от пользователя
         base_path: Базовый путь (по умолчанию SANDBOX_ROOT)
-    
+
     Returns:
         Полный безопасный путь
-        
+
     Raises:
         PermissionError: Если обнаружена попытка Path Traversal
         ValueError: Если путь содержит недопустимые символы
     """
     if base_path is None:
-        base_path = config.SANDBOX_ROOT
-    
+        return _resolve_cached(relative_path)
+
+    return _resolve_path(relative_path, base_path)
+
+
+def _resolve_path(relative_path: str, base_path: Path) -> Path:
+    """Разрешение и проверка пути относительно базовой директории"""
     # Нормализация пути
     normalized = os.path.normpath(relative_path)
     
@@ -29,12 +67,19 @@ def resolve_secure_path(relative_path: str, base_path: Path = None) -> Path:
     if os.path.sep in normalized and normalized.startswith(os.path.sep):
         normalized = normalized.lstrip(os.path.sep)
     
+    # Базовый путь песочницы уже разрешен при импорте модуля
+    if base_path is _SANDBOX_RESOLVED:
+        base_resolved = base_path
+    else:
+        base_resolved = base_path.resolve()
+
     # Разрешение полного пути
-    full_path = (base_path / normalized).resolve()
-    
-    # Критическая проверка: путь должен начинаться с base_path
-    base_resolved = base_path.resolve()
-    if not str(full_path).startswith(str(base_resolved)):
+    full_path = (base_resolved / normalized).resolve()
+
+    # Критическая проверка: путь должен лежать внутри base_path.
+    # is_relative_to сравнивает по компонентам и, в отличие от
+    # startswith, не пропускает соседний '/sandbox_evil' для '/sandbox'
+    if not full_path.is_relative_to(base_resolved):
         raise PermissionError(
             f"Path traversal detected: попытка выхода за пределы песочницы. "
             f"Запрошенный путь: {relative_path}"
@@ -56,26 +101,35 @@ def validate_filename(filename: str) -> str:
     Raises:
         ValueError: Если имя файла недопустимо
     """
-    # Получаем только базовое имя (без пути)
-    safe_name = os.path.basename(filename)
+    # Получаем только базовое имя (без пути). Вызывающие обычно передают
+    # уже отделенное имя (full_path.name после resolve_secure_path) —
+    # для строки без разделителей повторный basename не нужен
+    if os.path.sep in filename or (os.path.altsep and os.path.altsep in filename):
+        safe_name = os.path.basename(filename)
+    else:
+        safe_name = filename
     
     # Проверка длины
-    if len(safe_name) > config.MAX_FILENAME_LENGTH:
-        raise ValueError(f"Имя файла слишком длинное (максимум {config.MAX_FILENAME_LENGTH} символов)")
-    
-    # Проверка на недопустимые символы
-    invalid_chars = set('<>:"|?*\\')
-    if any(char in safe_name for char in invalid_chars):
-        raise ValueError(f"Имя файла содержит недопустимые символы: {invalid_chars}")
-    
+    if len(safe_name) > _MAX_FILENAME_LENGTH:
+        raise ValueError(f"Имя файла слишком длинное (максимум {_MAX_FILENAME_LENGTH} символов)")
+
+    _check_filename(safe_name)
+
+    return safe_name
+
+
+@functools.lru_cache(maxsize=4096)
+def _check_filename(safe_name: str) -> None:
+    """Чистая часть валидации имени: зависит только от аргумента,
+    поэтому для повторяющихся имен сводится к поиску в кэше.
+    Исключения lru_cache не запоминает — невалидные имена (редкий
+    случай) каждый раз проверяются заново."""
+    # Проверка на недопустимые символы: скомпилированный regex
+    # сканирует строку в C вместо цикла по Python-множеству
+    if _INVALID_CHARS_RE.search(safe_name):
+        raise ValueError(f"Имя файла содержит недопустимые символы: {set(_INVALID_CHARS)}")
+
     # Проверка на зарезервированные имена (Windows)
-    reserved_names = {
-        'CON', 'PRN', 'AUX', 'NUL',
-        'COM1', 'COM2', 'COM3', 'COM4', 'COM5', 'COM6', 'COM7', 'COM8', 'COM9',
-        'LPT1', 'LPT2', 'LPT3', 'LPT4', 'LPT5', 'LPT6', 'LPT7', 'LPT8', 'LPT9'
-    }
-    if safe_name.upper() in reserved_names:
+    if safe_name.upper() in _RESERVED_NAMES:
         raise ValueError(f"Имя файла '{safe_name}' зарезервировано системой")
-    
-    return safe_name
 
@@ -9,23 +9,34 @@ except ImportError:
     # Fallback на стандартный ElementTree если defusedxml не установлен
     from xml.etree.ElementTree import fromstring as safe_xml_fromstring
 
+try:
+    # orjson парсит и сериализует в разы быстрее стандартного json
+    import orjson
+except ImportError:
+    # Fallback на стандартный json если orjson не установлен
+    orjson = None
 
-def safe_load_json(data: str) -> Any:
+
+def safe_load_json(data: str | bytes) -> Any:
     """
     Безопасная загрузка JSON.
-    
+
     Args:
-        data: JSON строка
-        
+        data: JSON строка или байты (байты парсятся без
+            промежуточного декодирования)
+
     Returns:
         Десериализованный объект
-        
+
     Raises:
         ValueError: Если JSON невалиден
     """
     try:
+        if orjson is not None:
+            return orjson.loads(data)
         return json.loads(data)
-    except json.JSONDecodeError as e:
+    except ValueError as e:
+        # orjson.JSONDecodeError и json.JSONDecodeError — наследники ValueError
         raise ValueError(f"Невалидный JSON: {e}")
 
 
@@ -40,17 +51,22 @@ def safe_dump_json(obj: Any, indent: int = None) -> str:
     Returns:
         JSON строка
     """
+    if orjson is not None:
+        # orjson поддерживает только отступ в 2 пробела — этого достаточно
+        # для единственного вызывающего (read_file с indent=2)
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return orjson.dumps(obj, option=option).decode('utf-8')
     return json.dumps(obj, indent=indent, ensure_ascii=False)
 
 
-def safe_load_xml(data: str) -> Element:
+def safe_load_xml(data: str | bytes) -> Element:
     """
     Безопасная загрузка XML с защитой от XXE и других атак.
     Использует defusedxml для защиты.
-    
+
     Args:
-        data: XML строка
-        
+        data: XML строка или байты
+
     Returns:
         Корневой элемент XML дерева
         
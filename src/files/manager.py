@@ -1,4 +1,5 @@
 """Менеджер файлов с безопасными операциями"""
+import asyncio
 import os
 import shutil
 from pathlib import Path
@@ -7,12 +8,13 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.core.database import db
-from src.core.models import File, User, Operation, OperationType
+from src.core.models import File, OperationType
 from src.core.security import resolve_secure_path, validate_filename
 from src.core.locking import lock_manager
 from src.core.config import config
 from src.core.serialization import safe_load_json, safe_dump_json, safe_load_xml, safe_dump_xml
 from src.core.archive import safe_create_zip, safe_extract_zip, ArchiveSecurityError
+from src.operations.logger import log_operation
 
 
 class FileManager:
@@ -49,51 +51,43 @@ class FileManager:
                 f"Размер содержимого превышает максимальный ({config.MAX_UPLOAD_SIZE} байт)"
             )
         
-        async def _create():
+        def _create_fs():
             # Проверка существования
             if full_path.exists():
                 raise FileExistsError(f"Файл '{relative_path}' уже существует")
-            
+
             # Создание родительских директорий
             full_path.parent.mkdir(parents=True, exist_ok=True)
-            
+
             # Создание файла
             full_path.write_text(content, encoding='utf-8')
-            file_size = full_path.stat().st_size
-            
-            # Сохранение в БД
-            async with db.session() as session:
-                # Получаем пользователя
-                stmt = select(User).where(User.id == user_id)
-                result = await session.execute(stmt)
-                user = result.scalar_one_or_none()
-                
-                if not user:
-                    raise ValueError(f"Пользователь с ID {user_id} не найден")
-                
-                # Создаем запись о файле
-                file_record = File(
-                    filename=full_path.name,
-                    size=file_size,
-                    location=relative_path,
-                    owner_id=user_id
-                )
-                session.add(file_record)
-                await session.flush()
-                
-                # Логируем операцию
-                operation = Operation(
-                    operation_type=OperationType.CREATE,
-                    file_id=file_record.id,
-                    user_id=user_id
-                )
-                session.add(operation)
-                await session.commit()
-                await session.refresh(file_record)
-                
-                return file_record
-        
-        return await lock_manager.execute_locked(full_path, _create)
+            return full_path.stat().st_size
+
+        # Под блокировкой выполняется только работа с файловой системой;
+        # синхронные syscalls уходят в пул потоков, чтобы не блокировать
+        # event loop; транзакция БД идет уже после release
+        file_size = await lock_manager.execute_locked(
+            full_path, lambda: asyncio.to_thread(_create_fs)
+        )
+
+        # Сохранение в БД: существование пользователя гарантирует
+        # внешний ключ owner_id, отдельный SELECT не нужен
+        async with db.session() as session:
+            # Создаем запись о файле
+            file_record = File(
+                filename=full_path.name,
+                size=file_size,
+                location=relative_path,
+                owner_id=user_id
+            )
+            session.add(file_record)
+            # flush возвращает id через RETURNING одним round trip
+            await session.flush()
+
+        # Журнал пишется фоновым батчером — пачками, вне транзакции
+        await log_operation(OperationType.CREATE, file_record.id, user_id)
+
+        return file_record
     
     async def read_file(
         self,
@@ -111,34 +105,39 @@ class FileManager:
             Содержимое файла
         """
         full_path = resolve_secure_path(relative_path)
-        
-        if not full_path.exists() or not full_path.is_file():
-            raise FileNotFoundError(f"Файл '{relative_path}' не найден")
-        
-        # Проверка размера файла
-        file_size = full_path.stat().st_size
-        if file_size > config.MAX_FILE_SIZE:
-            raise ValueError(
-                f"Размер файла ({file_size} байт) превышает максимальный ({config.MAX_FILE_SIZE} байт)"
-            )
-        
-        content = full_path.read_text(encoding='utf-8')
-        
+
+        def _read_fs():
+            if not full_path.exists() or not full_path.is_file():
+                raise FileNotFoundError(f"Файл '{relative_path}' не найден")
+
+            # Проверка размера файла
+            file_size = full_path.stat().st_size
+            if file_size > config.MAX_FILE_SIZE:
+                raise ValueError(
+                    f"Размер файла ({file_size} байт) превышает максимальный ({config.MAX_FILE_SIZE} байт)"
+                )
+
+            # Файл читается один раз как байты; парсеры принимают bytes,
+            # так что для json/xml лишнее utf-8 декодирование не нужно
+            return full_path.read_bytes()
+
+        raw = await asyncio.to_thread(_read_fs)
+
         # Обработка форматов
         if format_type == "json":
             try:
-                data = safe_load_json(content)
+                data = safe_load_json(raw)
                 return safe_dump_json(data, indent=2)
             except ValueError as e:
                 raise ValueError(f"Ошибка парсинга JSON: {e}")
         elif format_type == "xml":
             try:
-                element = safe_load_xml(content)
+                element = safe_load_xml(raw)
                 return safe_dump_xml(element).decode('utf-8')
             except ValueError as e:
                 raise ValueError(f"Ошибка парсинга XML: {e}")
-        
-        return content
+
+        return raw.decode('utf-8')
     
     async def write_file(
         self,
@@ -160,72 +159,69 @@ class FileManager:
             Модель файла
         """
         full_path = resolve_secure_path(relative_path)
-        
-        # Проверка размера
-        content_size = len(content.encode('utf-8'))
-        if content_size > config.MAX_UPLOAD_SIZE:
+
+        # Кодируем один раз: байты идут и в проверку размера, и на диск
+        payload = content.encode('utf-8')
+        if len(payload) > config.MAX_UPLOAD_SIZE:
             raise ValueError(
                 f"Размер содержимого превышает максимальный ({config.MAX_UPLOAD_SIZE} байт)"
             )
-        
-        async def _write():
+
+        def _write_fs():
             if not full_path.exists():
                 raise FileNotFoundError(f"Файл '{relative_path}' не найден")
-            
-            # Безопасная запись через временный файл
+
+            if append:
+                # Дозапись в конец: O(размер добавки), а не чтение и
+                # переписывание всего файла через строки
+                with open(full_path, 'ab') as f:
+                    f.write(payload)
+                return full_path.stat().st_size
+
+            # Перезапись — безопасно через временный файл
             temp_path = full_path.with_suffix(full_path.suffix + '.tmp')
-            
+
             try:
-                if append:
-                    existing_content = full_path.read_text(encoding='utf-8')
-                    new_content = existing_content + content
-                else:
-                    new_content = content
-                
-                temp_path.write_text(new_content, encoding='utf-8')
-                
+                temp_path.write_bytes(payload)
+
                 # Атомарная замена
                 temp_path.replace(full_path)
-                
-                file_size = full_path.stat().st_size
-                
-                # Обновление в БД
-                async with db.session() as session:
-                    stmt = select(File).where(File.location == relative_path)
-                    result = await session.execute(stmt)
-                    file_record = result.scalar_one_or_none()
-                    
-                    if file_record:
-                        file_record.size = file_size
-                    else:
-                        # Создаем новую запись если её нет
-                        file_record = File(
-                            filename=full_path.name,
-                            size=file_size,
-                            location=relative_path,
-                            owner_id=user_id
-                        )
-                        session.add(file_record)
-                    
-                    await session.flush()
-                    
-                    # Логируем операцию
-                    operation = Operation(
-                        operation_type=OperationType.MODIFY,
-                        file_id=file_record.id,
-                        user_id=user_id
-                    )
-                    session.add(operation)
-                    await session.commit()
-                    await session.refresh(file_record)
-                    
-                    return file_record
+
+                return full_path.stat().st_size
             except Exception:
                 if temp_path.exists():
                     temp_path.unlink()
                 raise
-        
-        return await lock_manager.execute_locked(full_path, _write)
+
+        # Блокировка покрывает только файловые операции; БД — после
+        file_size = await lock_manager.execute_locked(
+            full_path, lambda: asyncio.to_thread(_write_fs)
+        )
+
+        # Обновление в БД
+        async with db.session() as session:
+            stmt = select(File).where(File.location == relative_path)
+            result = await session.execute(stmt)
+            file_record = result.scalar_one_or_none()
+
+            if file_record:
+                file_record.size = file_size
+            else:
+                # Создаем новую запись если её нет
+                file_record = File(
+                    filename=full_path.name,
+                    size=file_size,
+                    location=relative_path,
+                    owner_id=user_id
+                )
+                session.add(file_record)
+
+            await session.flush()
+
+        # Журнал пишется фоновым батчером — пачками, вне транзакции
+        await log_operation(OperationType.MODIFY, file_record.id, user_id)
+
+        return file_record
     
     async def delete_file(
         self,
@@ -241,30 +237,27 @@ class FileManager:
         """
         full_path = resolve_secure_path(relative_path)
         
-        async def _delete():
+        def _delete_fs():
             if not full_path.exists() or not full_path.is_file():
                 raise FileNotFoundError(f"Файл '{relative_path}' не найден")
-            
+
             # Удаление файла
             full_path.unlink()
-            
-            # Обновление БД
-            async with db.session() as session:
-                stmt = select(File).where(File.location == relative_path)
-                result = await session.execute(stmt)
-                file_record = result.scalar_one_or_none()
-                
-                if file_record:
-                    # Логируем операцию
-                    operation = Operation(
-                        operation_type=OperationType.DELETE,
-                        file_id=file_record.id,
-                        user_id=user_id
-                    )
-                    session.add(operation)
-                    await session.commit()
-        
-        await lock_manager.execute_locked(full_path, _delete)
+
+        # Блокировка покрывает только удаление с диска; БД — после
+        await lock_manager.execute_locked(
+            full_path, lambda: asyncio.to_thread(_delete_fs)
+        )
+
+        # Поиск записи — read-only сессия без транзакции
+        async with db.read_session() as session:
+            stmt = select(File).where(File.location == relative_path)
+            result = await session.execute(stmt)
+            file_record = result.scalar_one_or_none()
+
+        if file_record:
+            # Журнал пишется фоновым батчером — пачками, вне транзакции
+            await log_operation(OperationType.DELETE, file_record.id, user_id)
     
     async def create_directory(
         self,
@@ -278,13 +271,15 @@ class FileManager:
         """
         full_path = resolve_secure_path(relative_path)
         
-        async def _create():
+        def _create():
             if full_path.exists():
                 raise FileExistsError(f"Директория '{relative_path}' уже существует")
-            
+
             full_path.mkdir(parents=True, exist_ok=True)
-        
-        await lock_manager.execute_locked(full_path, _create)
+
+        await lock_manager.execute_locked(
+            full_path, lambda: asyncio.to_thread(_create)
+        )
     
     async def delete_directory(
         self,
@@ -300,11 +295,12 @@ class FileManager:
         """
         full_path = resolve_secure_path(relative_path)
         
-        async def _delete():
+        def _delete():
             if not full_path.exists() or not full_path.is_dir():
                 raise FileNotFoundError(f"Директория '{relative_path}' не найдена")
-            
+
             if recursive:
+                # rmtree на большом дереве занимает секунды — в потоке
                 shutil.rmtree(full_path)
             else:
                 if any(full_path.iterdir()):
@@ -312,8 +308,10 @@ class FileManager:
                         f"Директория '{relative_path}' не пуста. Используйте флаг -r для рекурсивного удаления"
                     )
                 full_path.rmdir()
-        
-        await lock_manager.execute_locked(full_path, _delete)
+
+        await lock_manager.execute_locked(
+            full_path, lambda: asyncio.to_thread(_delete)
+        )
     
     async def move(
         self,
@@ -330,20 +328,22 @@ class FileManager:
         source_path = resolve_secure_path(source)
         dest_path = resolve_secure_path(destination)
         
-        async def _move():
+        def _move():
             if not source_path.exists():
                 raise FileNotFoundError(f"Источник '{source}' не найден")
-            
+
             if dest_path.exists():
                 raise FileExistsError(f"Путь назначения '{destination}' уже существует")
-            
+
             # Создаем родительские директории
             dest_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            # Безопасное перемещение
+
+            # Безопасное перемещение (между дисками — это копирование)
             shutil.move(str(source_path), str(dest_path))
-        
-        await lock_manager.execute_locked_multi([source_path, dest_path], _move)
+
+        await lock_manager.execute_locked_multi(
+            [source_path, dest_path], lambda: asyncio.to_thread(_move)
+        )
     
     async def list_directory(
         self,
@@ -359,26 +359,32 @@ class FileManager:
             Список словарей с информацией о файлах и директориях
         """
         full_path = resolve_secure_path(relative_path)
-        
-        if not full_path.exists() or not full_path.is_dir():
-            raise NotADirectoryError(f"Директория '{relative_path}' не найдена")
-        
-        items = []
-        for item in full_path.iterdir():
-            if item.is_dir():
-                items.append({
-                    "name": item.name,
-                    "type": "directory",
-                    "size": None,
-                })
-            else:
-                items.append({
-                    "name": item.name,
-                    "type": "file",
-                    "size": item.stat().st_size,
-                })
-        
-        return sorted(items, key=lambda x: (x["type"] != "directory", x["name"]))
+
+        def _list_fs():
+            if not full_path.is_dir():
+                raise NotADirectoryError(f"Директория '{relative_path}' не найдена")
+
+            items = []
+            # os.scandir отдает тип и stat из данных самого readdir:
+            # вместо двух stat на каждый элемент — ноль или один syscall
+            with os.scandir(full_path) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        items.append({
+                            "name": entry.name,
+                            "type": "directory",
+                            "size": None,
+                        })
+                    else:
+                        items.append({
+                            "name": entry.name,
+                            "type": "file",
+                            "size": entry.stat(follow_symlinks=False).st_size,
+                        })
+
+            return sorted(items, key=lambda x: (x["type"] != "directory", x["name"]))
+
+        return await asyncio.to_thread(_list_fs)
     
     async def create_zip(
         self,
@@ -401,7 +407,11 @@ class FileManager:
             archive_full_path = resolve_secure_path(archive_path)
             source_paths = [resolve_secure_path(s) for s in sources]
             
-            result_path = safe_create_zip(source_paths, archive_full_path)
+            # Сжатие выполняется в пуле потоков, чтобы не блокировать
+            # event loop (zlib отпускает GIL во время deflate)
+            result_path = await asyncio.to_thread(
+                safe_create_zip, source_paths, archive_full_path
+            )
             
             # Сохранение в БД
             async with db.session() as session:
@@ -413,15 +423,9 @@ class FileManager:
                 )
                 session.add(file_record)
                 await session.flush()
-                
-                operation = Operation(
-                    operation_type=OperationType.CREATE,
-                    file_id=file_record.id,
-                    user_id=user_id
-                )
-                session.add(operation)
-                await session.commit()
-            
+
+            await log_operation(OperationType.CREATE, file_record.id, user_id)
+
             return result_path
         except ArchiveSecurityError as e:
             raise ValueError(f"Ошибка безопасности при создании архива: {e}")
@@ -430,14 +434,16 @@ class FileManager:
         self,
         archive_path: str,
         destination: str,
+        recurse_nested: bool = False,
     ) -> list[Path]:
         """
         Распаковка ZIP архива.
-        
+
         Args:
             archive_path: Путь к архиву
             destination: Путь назначения
-            
+            recurse_nested: Распаковывать ли вложенные ZIP архивы
+
         Returns:
             Список распакованных файлов
         """
@@ -448,7 +454,11 @@ class FileManager:
             if not archive_full_path.exists():
                 raise FileNotFoundError(f"Архив '{archive_path}' не найден")
             
-            return safe_extract_zip(archive_full_path, dest_full_path)
+            # Распаковка так же уходит в пул потоков
+            return await asyncio.to_thread(
+                safe_extract_zip, archive_full_path, dest_full_path,
+                None, recurse_nested,
+            )
         except ArchiveSecurityError as e:
             raise ValueError(f"Ошибка безопасности при распаковке архива: {e}")
 
@@ -1,58 +1,237 @@
-"""Модуль логирования операций пользователей"""
-from datetime import datetime
-from sqlalchemy import select, desc
-from sqlalchemy.ext.asyncio import AsyncSession
-
-from src.core.database import db
-from src.core.models import Operation, User, File
-
-
-async def get_user_operations(
-    user_id: int,
-    limit: int = 100,
-) -> list[Operation]:
-    """
-    Получить операции пользователя.
-    
-    Args:
-        user_id: ID пользователя
-        limit: Максимальное количество записей
-        
-    Returns:
-        Список операций
-    """
-    async with db.session() as session:
-        stmt = (
-            select(Operation)
-            .where(Operation.user_id == user_id)
-            .order_by(desc(Operation.timestamp))
-            .limit(limit)
-        )
-        result = await session.execute(stmt)
-        return list(result.scalars().all())
-
-
-async def get_file_operations(
-    file_id: int,
-    limit: int = 100,
-) -> list[Operation]:
-    """
-    Получить операции с файлом.
-    
-    Args:
-        file_id: ID файла
-        limit: Максимальное количество записей
-        
-    Returns:
-        Список операций
-    """
-    async with db.session() as session:
-        stmt = (
-            select(Operation)
-            .where(Operation.file_id == file_id)
-            .order_by(desc(Operation.timestamp))
-            .limit(limit)
-        )
-        result = await session.execute(stmt)
-        return list(result.scalars().all())
-
+"""Модуль логирования операций пользователей"""
+import asyncio
+from datetime import datetime
+from sqlalchemy import bindparam, insert, select, desc, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.core.database import db
+from src.core.models import Operation, OperationType, User, File
+
+# Батчинг записи журнала: вместо INSERT на каждое событие операции
+# копятся в очереди и пишутся фоновой задачей одним multi-VALUES
+# INSERT — один round trip на пачку
+_MAX_BATCH = 500
+_FLUSH_INTERVAL = 0.1  # секунды
+# Предел очереди: если флашер отстает или умер, очередь не растет
+# бесконечно, а put() дает обратное давление на продюсеров
+_MAX_QUEUE = 10_000
+
+_queue: asyncio.Queue | None = None
+_flusher_task: asyncio.Task | None = None
+
+
+def start_operation_writer() -> None:
+    """Запустить фоновый батчер журнала операций (идемпотентно)"""
+    global _queue, _flusher_task
+
+    if _flusher_task is not None and not _flusher_task.done():
+        return
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=_MAX_QUEUE)
+    _flusher_task = asyncio.get_running_loop().create_task(_flush_loop())
+
+
+async def stop_operation_writer() -> None:
+    """Остановить батчер, дописав накопившееся в очереди"""
+    global _flusher_task
+
+    if _flusher_task is None:
+        return
+    _flusher_task.cancel()
+    try:
+        await _flusher_task
+    except asyncio.CancelledError:
+        pass
+    _flusher_task = None
+
+
+async def log_operation(
+    operation_type: OperationType,
+    file_id: int,
+    user_id: int,
+) -> None:
+    """
+    Записать операцию в журнал.
+
+    При запущенном батчере событие ставится в очередь и уходит в БД
+    фоновой пачкой; иначе пишется сразу в собственной транзакции.
+    """
+    row = {
+        "operation_type": operation_type,
+        "file_id": file_id,
+        "user_id": user_id,
+    }
+
+    if _flusher_task is not None and not _flusher_task.done():
+        await _queue.put(row)
+        return
+
+    async with db.session() as session:
+        await session.execute(insert(Operation), [row])
+
+
+async def _flush_loop() -> None:
+    """Фоновый цикл: собирает пачку и пишет одним INSERT"""
+    try:
+        while True:
+            batch = [await _queue.get()]
+            # Добираем накопившееся: до _MAX_BATCH строк или пока новые
+            # события не перестанут приходить в течение _FLUSH_INTERVAL
+            try:
+                async with asyncio.timeout(_FLUSH_INTERVAL):
+                    while len(batch) < _MAX_BATCH:
+                        batch.append(await _queue.get())
+            except TimeoutError:
+                pass
+
+            await _write_batch(batch)
+    except asyncio.CancelledError:
+        # Финальный слив очереди при остановке
+        rest = []
+        while not _queue.empty():
+            rest.append(_queue.get_nowait())
+        if rest:
+            await _write_batch(rest)
+        raise
+
+
+async def _write_batch(batch: list[dict]) -> None:
+    try:
+        async with db.session() as session:
+            await session.execute(insert(Operation), batch)
+    except Exception as e:
+        # Сбой записи не роняет фоновую задачу, но и не проходит
+        # молча: пачка потеряна — сообщаем сколько и почему
+        print(f"Ошибка записи журнала операций (потеряно записей: {len(batch)}): {e}")
+
+# Запросы строятся один раз на уровне модуля: SQLAlchemy кэширует
+# скомпилированный SQL по объекту statement, и повторные вызовы
+# минуют фазу компиляции (для коротких запросов она сравнима со
+# временем выполнения)
+# Сортировка и курсор везде по паре (timestamp, id): батчевая запись
+# журнала дает целой пачке одинаковый now() в рамках транзакции, и один
+# timestamp не упорядочивает строки и не годится как граница страницы
+_STMT_USER_OPS = (
+    select(Operation)
+    .where(Operation.user_id == bindparam("uid"))
+    .order_by(desc(Operation.timestamp), desc(Operation.id))
+    .limit(bindparam("lim"))
+)
+
+_STMT_FILE_OPS = (
+    select(Operation)
+    .where(Operation.file_id == bindparam("fid"))
+    .order_by(desc(Operation.timestamp), desc(Operation.id))
+    .limit(bindparam("lim"))
+)
+
+# Варианты с курсором для keyset-пагинации: сравнение кортежей
+# (timestamp, id) < (:ts, :oid) ищется по индексу за O(log N) вне
+# зависимости от глубины страницы, в отличие от OFFSET, который
+# перечитывает все пропускаемые строки
+_STMT_USER_OPS_BEFORE = (
+    select(Operation)
+    .where(
+        Operation.user_id == bindparam("uid"),
+        tuple_(Operation.timestamp, Operation.id)
+        < tuple_(bindparam("ts"), bindparam("oid")),
+    )
+    .order_by(desc(Operation.timestamp), desc(Operation.id))
+    .limit(bindparam("lim"))
+)
+
+_STMT_FILE_OPS_BEFORE = (
+    select(Operation)
+    .where(
+        Operation.file_id == bindparam("fid"),
+        tuple_(Operation.timestamp, Operation.id)
+        < tuple_(bindparam("ts"), bindparam("oid")),
+    )
+    .order_by(desc(Operation.timestamp), desc(Operation.id))
+    .limit(bindparam("lim"))
+)
+
+
+async def get_user_operations(
+    user_id: int,
+    limit: int = 100,
+    before_ts: datetime | None = None,
+    before_id: int | None = None,
+) -> list[Operation]:
+    """
+    Получить операции пользователя.
+
+    Args:
+        user_id: ID пользователя
+        limit: Максимальное количество записей
+        before_ts: Курсор пагинации — timestamp последней записи
+            предыдущей страницы
+        before_id: id той же записи; без него страница, граница которой
+            попала внутрь серии одинаковых timestamp (батчевая запись
+            дает пачке одно время), пропустила бы остаток серии
+
+    Returns:
+        Список операций
+    """
+    async with db.session() as session:
+        if before_ts is not None:
+            result = await session.execute(
+                _STMT_USER_OPS_BEFORE,
+                {
+                    "uid": user_id,
+                    "lim": limit,
+                    "ts": before_ts,
+                    # id <= 0 не встречается: курсор без id вырождается
+                    # в прежнее строгое timestamp < :ts
+                    "oid": before_id if before_id is not None else 0,
+                },
+            )
+        else:
+            result = await session.execute(
+                _STMT_USER_OPS, {"uid": user_id, "lim": limit}
+            )
+        # .all() уже возвращает список — копия через list() не нужна
+        return result.scalars().all()
+
+
+async def get_file_operations(
+    file_id: int,
+    limit: int = 100,
+    before_ts: datetime | None = None,
+    before_id: int | None = None,
+) -> list[Operation]:
+    """
+    Получить операции с файлом.
+
+    Args:
+        file_id: ID файла
+        limit: Максимальное количество записей
+        before_ts: Курсор пагинации — timestamp последней записи
+            предыдущей страницы
+        before_id: id той же записи; без него страница, граница которой
+            попала внутрь серии одинаковых timestamp (батчевая запись
+            дает пачке одно время), пропустила бы остаток серии
+
+    Returns:
+        Список операций
+    """
+    async with db.session() as session:
+        if before_ts is not None:
+            result = await session.execute(
+                _STMT_FILE_OPS_BEFORE,
+                {
+                    "fid": file_id,
+                    "lim": limit,
+                    "ts": before_ts,
+                    # id <= 0 не встречается: курсор без id вырождается
+                    # в прежнее строгое timestamp < :ts
+                    "oid": before_id if before_id is not None else 0,
+                },
+            )
+        else:
+            result = await session.execute(
+                _STMT_FILE_OPS, {"fid": file_id, "lim": limit}
+            )
+        # .all() уже возвращает список — копия через list() не нужна
+        return result.scalars().all()
+
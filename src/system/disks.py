@@ -1,36 +1,101 @@
 """Модуль для получения информации о дисках"""
+import functools
 import shutil
 import platform
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 
+# TTL-кэши: statvfs/statfs по каждому mountpoint — реальные syscalls,
+# на HDD вызывающие движение головок. Занятость дисков меняется
+# посекундно, топология разделов — практически никогда
+_USAGE_TTL = 1.0
+_PARTITIONS_TTL = 30.0
+_usage_cache: tuple[float, List[Dict]] | None = None
+_partitions_cache: tuple[float, list] | None = None
+
+# Псевдо-файловые системы: их занятость не интересна пользователю,
+# а на машинах с контейнерами таких монтирований десятки
+_SKIP_FS = frozenset({
+    'squashfs', 'tmpfs', 'devtmpfs', 'overlay',
+    'proc', 'sysfs', 'cgroup', 'cgroup2', 'fuse.gvfsd-fuse',
+})
+
+
+def _get_partitions() -> list:
+    """Список разделов с 30-секундным кэшем"""
+    global _partitions_cache
+
+    now = time.monotonic()
+    if _partitions_cache is not None and now - _partitions_cache[0] < _PARTITIONS_TTL:
+        return _partitions_cache[1]
+
+    import psutil
+
+    partitions = psutil.disk_partitions()
+    _partitions_cache = (now, partitions)
+    return partitions
+
 
 def get_disk_info() -> List[Dict]:
     """
     Получить информацию о дисках системы.
-    
+
+    Результат кэшируется на _USAGE_TTL секунд: повторные вызовы
+    возвращаются из памяти без statfs.
+
     Returns:
         Список словарей с информацией о дисках
     """
+    global _usage_cache
+
+    now = time.monotonic()
+    if _usage_cache is not None and now - _usage_cache[0] < _USAGE_TTL:
+        return _usage_cache[1]
+
+    disks = _collect_disk_info()
+    _usage_cache = (now, disks)
+    return disks
+
+
+def _safe_disk_usage(partition):
+    """disk_usage без исключений: недоступная точка монтирования дает None"""
+    try:
+        return partition, shutil.disk_usage(partition.mountpoint)
+    except (PermissionError, OSError):
+        return partition, None
+
+
+def _collect_disk_info() -> List[Dict]:
+    """Сбор информации о дисках без кэширования"""
     disks = []
-    
+
     try:
-        import psutil
-        
-        partitions = psutil.disk_partitions()
-        for partition in partitions:
-            try:
-                usage = shutil.disk_usage(partition.mountpoint)
-                disks.append({
-                    "name": partition.device,
-                    "mountpoint": partition.mountpoint,
-                    "fstype": partition.fstype,
-                    "total": usage.total,
-                    "used": usage.used,
-                    "free": usage.free,
-                    "usage_percent": (usage.used / usage.total * 100) if usage.total > 0 else 0,
-                })
-            except (PermissionError, OSError):
+        partitions = [
+            p for p in _get_partitions() if p.fstype not in _SKIP_FS
+        ]
+
+        # statfs по независимым устройствам идут параллельно: общее
+        # время — самый медленный mount, а не сумма по всем (важно при
+        # подвешенных сетевых томах)
+        if partitions:
+            with ThreadPoolExecutor(max_workers=min(8, len(partitions))) as executor:
+                results = list(executor.map(_safe_disk_usage, partitions))
+        else:
+            results = []
+
+        for partition, usage in results:
+            if usage is None:
                 continue
+            disks.append({
+                "name": partition.device,
+                "mountpoint": partition.mountpoint,
+                "fstype": partition.fstype,
+                "total": usage.total,
+                "used": usage.used,
+                "free": usage.free,
+                "usage_percent": (usage.used / usage.total * 100) if usage.total > 0 else 0,
+            })
     except ImportError:
         # Fallback на shutil для базовой информации
         if platform.system() == "Windows":
@@ -66,11 +131,29 @@ def get_disk_info() -> List[Dict]:
     return disks
 
 
+async def get_disk_info_async() -> List[Dict]:
+    """Асинхронная обертка: statfs уходят в пул потоков, event loop
+    не блокируется; попадание в TTL-кэш возвращается без потока."""
+    global _usage_cache
+
+    now = time.monotonic()
+    if _usage_cache is not None and now - _usage_cache[0] < _USAGE_TTL:
+        return _usage_cache[1]
+
+    import asyncio
+
+    return await asyncio.to_thread(get_disk_info)
+
+
+_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+
+@functools.lru_cache(maxsize=4096)
 def format_bytes(bytes_count: int) -> str:
-    """Форматирование размера в байтах"""
-    for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-        if bytes_count < 1024.0:
-            return f"{bytes_count:.2f} {unit}"
-        bytes_count /= 1024.0
-    return f"{bytes_count:.2f} PB"
+    """Форматирование размера в байтах (мемоизировано: размеры повторяются).
+
+    Порядок величины берется из bit_length — одно деление вместо
+    цикла делений на 1024."""
+    idx = min(len(_UNITS) - 1, max(0, (int(bytes_count).bit_length() - 1) // 10))
+    return f"{bytes_count / (1 << (idx * 10)):.2f} {_UNITS[idx]}"
 
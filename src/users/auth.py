@@ -1,11 +1,39 @@
-"""Модуль аутентификации пользователей"""
+"""Модуль аутентификации пользователей.
+
+Правило модуля: любое сравнение секретов и их хешей вне bcrypt.checkpw
+(который сравнивает за константное время сам) выполняется только через
+_eq (hmac.compare_digest) — сравнение `==` утекает по времени.
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import bcrypt
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.core.config import config
 from src.core.database import db
 from src.core.models import User
 
+# Сравнение без утечки по времени — для любых сравнений хешей/дайджестов
+# вне bcrypt.checkpw (см. правило в докстринге модуля)
+_eq = hmac.compare_digest
+
+# Запросы построены один раз: повторные вызовы переиспользуют
+# скомпилированный SQL из кэша SQLAlchemy
+# Для проверки существования строка целиком не нужна: SELECT 1 ... LIMIT 1
+# не гоняет колонки по сети и не гидрирует ORM-объект
+_STMT_USER_EXISTS = select(1).where(User.username == bindparam("u")).limit(1)
+# Для логина достаточно id и хеша; остальные колонки не нужны
+_STMT_AUTH_CREDS = select(User.id, User.password_hash).where(
+    User.username == bindparam("u")
+)
+
 
 def hash_password(password: str) -> str:
     """
@@ -17,14 +45,15 @@ def hash_password(password: str) -> str:
     Returns:
         Хеш пароля в виде строки
     """
-    # bcrypt требует bytes, ограничение 72 байта
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    
-    salt = bcrypt.gensalt()
+    # bcrypt требует bytes и смотрит только на первые 72 байта;
+    # срез безусловный — для коротких строк он бесплатен
+    password_bytes = password.encode('utf-8')[:72]
+
+    # Стоимость конфигурируема: операторы масштабируют ее под железо
+    salt = bcrypt.gensalt(rounds=config.BCRYPT_ROUNDS)
     password_hash = bcrypt.hashpw(password_bytes, salt)
-    return password_hash.decode('utf-8')
+    # Вывод bcrypt — чистый ASCII
+    return password_hash.decode('ascii')
 
 
 def verify_password(password: str, password_hash: str) -> bool:
@@ -38,14 +67,120 @@ def verify_password(password: str, password_hash: str) -> bool:
     Returns:
         True если пароль верный, иначе False
     """
-    password_bytes = password.encode('utf-8')
-    if len(password_bytes) > 72:
-        password_bytes = password_bytes[:72]
-    
-    hash_bytes = password_hash.encode('utf-8')
+    password_bytes = password.encode('utf-8')[:72]
+
+    # Хеш bcrypt — ASCII, utf-8 кодек здесь не нужен
+    hash_bytes = password_hash.encode('ascii')
     return bcrypt.checkpw(password_bytes, hash_bytes)
 
 
+# Фиктивный хеш для выравнивания времени ответа при несуществующем
+# пользователе: вычисляется один раз при импорте
+_DUMMY_HASH = hash_password("timing-defense-dummy")
+
+# Пул процессов для bcrypt: хеширование при cost 12 занимает сотни
+# миллисекунд чистого CPU, в отдельных процессах логины не упираются
+# в GIL и не блокируют event loop
+_bcrypt_pool: ProcessPoolExecutor | None = None
+
+
+def _get_bcrypt_pool() -> ProcessPoolExecutor:
+    """Пул создается лениво — при первой операции с паролем"""
+    global _bcrypt_pool
+    if _bcrypt_pool is None:
+        _bcrypt_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _bcrypt_pool
+
+
+# Кэш успешных аутентификаций: для клиентов, шлющих учетные данные на
+# каждый запрос, bcrypt выполняется раз в TTL-окно, а не каждый раз.
+# Сырые пароли в памяти не хранятся — ключом служит HMAC-SHA256 с
+# эфемерным ключом процесса; TTL ограничивает задержку распространения
+# смены пароля
+_AUTH_CACHE_TTL = 30.0  # секунды
+_AUTH_CACHE_MAX = 10_000
+_AUTH_HMAC_KEY = secrets.token_bytes(32)
+# username -> (срок годности, HMAC пароля, id пользователя)
+_auth_cache: dict[str, tuple[float, bytes, int]] = {}
+
+
+def _password_digest(password: str) -> bytes:
+    """HMAC-SHA256 пароля с ключом процесса"""
+    return hmac.new(
+        _AUTH_HMAC_KEY, password.encode('utf-8'), hashlib.sha256
+    ).digest()
+
+
+def _auth_cache_get(username: str, digest: bytes) -> int | None:
+    """ID пользователя из кэша, если запись жива и дайджест совпал"""
+    cached = _auth_cache.get(username)
+    if cached is None:
+        return None
+
+    expires_at, cached_digest, user_id = cached
+    if time.monotonic() >= expires_at:
+        _auth_cache.pop(username, None)
+        return None
+
+    if _eq(cached_digest, digest):
+        return user_id
+    return None
+
+
+def _auth_cache_put(username: str, digest: bytes, user_id: int) -> None:
+    """Запомнить успешную аутентификацию на _AUTH_CACHE_TTL секунд"""
+    if len(_auth_cache) >= _AUTH_CACHE_MAX:
+        now = time.monotonic()
+        expired = [k for k, v in _auth_cache.items() if v[0] <= now]
+        for key in expired:
+            del _auth_cache[key]
+        if len(_auth_cache) >= _AUTH_CACHE_MAX:
+            # Кэш короткоживущий: достаточно вытеснить самую старую запись
+            _auth_cache.pop(next(iter(_auth_cache)))
+
+    _auth_cache[username] = (time.monotonic() + _AUTH_CACHE_TTL, digest, user_id)
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password в пуле процессов, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_bcrypt_pool(), hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """verify_password в пуле процессов, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_bcrypt_pool(), verify_password, password, password_hash
+    )
+
+
+async def verify_passwords_batch(pairs: list[tuple[str, str]]) -> list[bool]:
+    """
+    Параллельная проверка набора пар (пароль, хеш).
+
+    Для массовых сценариев (аудит паролей, переигрывание логинов):
+    пары раскладываются по ядрам через bcrypt-пул, пропускная
+    способность растет почти линейно с числом процессов.
+
+    Args:
+        pairs: Список пар (пароль, хеш из БД)
+
+    Returns:
+        Список результатов проверки в исходном порядке
+    """
+    if not pairs:
+        return []
+
+    loop = asyncio.get_running_loop()
+    pool = _get_bcrypt_pool()
+    futures = [
+        loop.run_in_executor(pool, verify_password, password, password_hash)
+        for password, password_hash in pairs
+    ]
+    return list(await asyncio.gather(*futures))
+
+
 async def create_user(username: str, password: str) -> User:
     """
     Создание нового пользователя.
@@ -60,26 +195,28 @@ async def create_user(username: str, password: str) -> User:
     Raises:
         ValueError: Если пользователь уже существует
     """
+    # Хеширование до открытия сессии: bcrypt занимает сотни миллисекунд,
+    # и держать на это время соединение из пула расточительно
+    password_hash = await hash_password_async(password)
+
     async with db.session() as session:
         # Проверка существования пользователя (prepared statement через SQLAlchemy)
-        stmt = select(User).where(User.username == username)
-        result = await session.execute(stmt)
-        existing_user = result.scalar_one_or_none()
-        
-        if existing_user:
+        result = await session.execute(_STMT_USER_EXISTS, {"u": username})
+
+        if result.first():
             raise ValueError(f"Пользователь '{username}' уже существует")
-        
+
         # Создание нового пользователя
-        password_hash = hash_password(password)
         new_user = User(
             username=username,
             password_hash=password_hash
         )
         
         session.add(new_user)
+        # flush получает id через INSERT ... RETURNING; у User нет
+        # server_default-колонок, так что refresh был бы лишним SELECT
         await session.flush()
-        await session.refresh(new_user)
-        
+
         return new_user
 
 
@@ -94,17 +231,35 @@ async def authenticate_user(username: str, password: str) -> User | None:
     Returns:
         Пользователь если аутентификация успешна, иначе None
     """
-    async with db.session() as session:
-        # Поиск пользователя (prepared statement через SQLAlchemy)
-        stmt = select(User).where(User.username == username)
-        result = await session.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if user and verify_password(password, user.password_hash):
+    digest = _password_digest(password)
+
+    # Недавняя успешная аутентификация минует bcrypt целиком
+    cached_id = _auth_cache_get(username, digest)
+    if cached_id is not None:
+        user = await get_user_by_id(cached_id)
+        if user is not None:
             return user
-        
+
+    # Узкая проекция: по сети идут только id и password_hash; сессия
+    # закрывается до bcrypt, чтобы соединение не простаивало в пуле
+    # на время CPU-тяжелой проверки
+    async with db.read_session() as session:
+        result = await session.execute(_STMT_AUTH_CREDS, {"u": username})
+        row = result.first()
+
+    if row is None:
+        # bcrypt выполняется и для несуществующего имени: иначе
+        # быстрый отказ выдает по времени, есть ли имя в базе
+        await verify_password_async(password, _DUMMY_HASH)
         return None
 
+    if await verify_password_async(password, row.password_hash):
+        _auth_cache_put(username, digest, row.id)
+        # Полный объект гидрируется только после успешного bcrypt
+        return await get_user_by_id(row.id)
+
+    return None
+
 
 async def get_user_by_id(user_id: int) -> User | None:
     """
@@ -117,7 +272,7 @@ async def get_user_by_id(user_id: int) -> User | None:
         Пользователь или None
     """
     async with db.session() as session:
-        stmt = select(User).where(User.id == user_id)
-        result = await session.execute(stmt)
-        return result.scalar_one_or_none()
+        # session.get сначала смотрит в identity map: уже загруженный
+        # в сессии пользователь возвращается без запроса к БД
+        return await session.get(User, user_id)
 